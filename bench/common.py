@@ -0,0 +1,64 @@
+# Общие части бенчмарков: импорт приложения без побочных эффектов и синтетические данные
+import os
+import sys
+import json
+import random
+import resource
+from typing import Dict, List, Optional
+
+os.environ.setdefault("DB_URL", "sqlite://")
+os.environ.setdefault("REDIS_URL", "redis://localhost:1/0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from end_homework_for_2ppa import StudentsDAO, Student
+
+FACULTIES = ["АВТФ", "ФПМИ", "ФЛА", "РЭФ", "ФМА", "ФТФ"]
+COURSES = ["Мат. Анализ", "Теор. Механика", "Физика", "Программирование"]
+
+def seed(dao: StudentsDAO, rows: int, chunk: int = 5000):
+    rnd = random.Random(1)
+    with Session(dao.engine) as s:
+        for start in range(0, rows, chunk):
+            s.execute(insert(Student), [
+                {"surname": f"S{i}", "name": f"N{i}", "faculty": rnd.choice(FACULTIES), "course": rnd.choice(COURSES), "grade": rnd.randint(0, 100)}
+                for i in range(start, min(rows, start + chunk))
+            ])
+            s.commit()
+
+SURNAMES = ["Иванов", "Ли", "Ким", "Пак", "Браун", "Джонс", "Смирнова", "Райт", "Тан", "Кузнецов"]
+NAMES = ["Иван", "Петр", "Анна", "Мария", "Николай", "Андрей", "Вероника", "Екатерина"]
+
+# CSV в формате students.csv на rows строк (заголовок на русском, utf-8-sig);
+# vocab — значения полей, по умолчанию встроенные списки выше
+def write_csv(path: str, rows: int, seed_value: int = 1, chunk: int = 100000, vocab: Optional[Dict[str, List[str]]] = None):
+    vocab = vocab or {"surname": SURNAMES, "name": NAMES, "faculty": FACULTIES, "course": COURSES}
+    sur, nam, fac, cou = vocab["surname"], vocab["name"], vocab["faculty"], vocab["course"]
+    rnd = random.Random(seed_value)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("Фамилия,Имя,Факультет,Курс,Оценка\r\n")
+        for start in range(0, rows, chunk):
+            f.write("".join(
+                f"{rnd.choice(sur)},{rnd.choice(nam)},{rnd.choice(fac)},{rnd.choice(cou)},{rnd.randint(0, 100)}\r\n"
+                for _ in range(start, min(rows, start + chunk))
+            ))
+
+# RSS процесса на пике, МБ (ru_maxrss в Linux — КБ, в macOS — байты)
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 3)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def write_report(report: dict, out: Optional[str]):
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,41 @@
+# python -m bench.csv_reader --rows 10000000
+# Разбор CSV для загрузчика: csv.DictReader (read_csv_rows) против mmap-ридера
+# (read_csv_tuples) и его обёртки со словарями (read_csv_students)
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from bench.common import write_csv
+from end_homework_for_2ppa import read_csv_rows, read_csv_tuples, read_csv_students
+
+def run(fn, path: str) -> dict:
+    t0 = time.perf_counter()
+    n = 0
+    for _ in fn(path):
+        n += 1
+    dt = time.perf_counter() - t0
+    return {"rows": n, "seconds": round(dt, 2), "rows_per_s": round(n / dt)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000000)
+    ap.add_argument("--path", help="готовый CSV вместо сгенерированного")
+    args = ap.parse_args()
+    path = args.path
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "students.csv")
+        write_csv(path, args.rows)
+    results = {
+        "dictreader": run(read_csv_rows, path),
+        "mmap_tuples": run(read_csv_tuples, path),
+        "mmap_dicts": run(read_csv_students, path),
+    }
+    base = results["dictreader"]["seconds"]
+    for r in results.values():
+        r["speedup"] = round(base / r["seconds"], 2) if r["seconds"] else None
+    print(json.dumps({"bench": "csv_reader", "params": {"rows": args.rows, "bytes": os.path.getsize(path)}, "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# python -m bench.dao_micro --rows 100000 --calls 300 --out dao_micro.json
+# Микробенчмарки каждого метода StudentsDAO на файловой SQLite: задержка
+# вызова (p50/p95/p99) и вызовов в секунду. Тяжёлые методы (полное чтение,
+# загрузка CSV) вызываются реже — см. HEAVY
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from bench.common import StudentsDAO, FACULTIES, COURSES, seed, write_csv, percentiles, peak_rss_mb, write_report
+
+HEAVY = {"select_all", "iter_students", "load_from_csv", "import_csv"}
+
+def student(rnd: random.Random) -> dict:
+    return {"surname": f"S{rnd.randint(0, 10**6)}", "name": "N", "faculty": rnd.choice(FACULTIES), "course": rnd.choice(COURSES), "grade": rnd.randint(0, 100)}
+
+def cases(dao: StudentsDAO, rows: int, rnd: random.Random, tmp: str) -> dict:
+    new_ids = []
+    csv_files = iter(range(10**6))
+
+    def csv_file():
+        path = os.path.join(tmp, f"load_{next(csv_files)}.csv")
+        write_csv(path, 1000, seed_value=rnd.randint(0, 10**9))
+        return path
+
+    def insert():
+        r = student(rnd)
+        new_ids.append(dao.insert(r["surname"], r["name"], r["faculty"], r["course"], r["grade"]))
+
+    def insert_many():
+        new_ids.extend(dao.insert_many([student(rnd) for _ in range(100)]))
+
+    def delete():
+        if new_ids:
+            dao.delete(new_ids.pop())
+
+    def delete_many():
+        batch = [new_ids.pop() for _ in range(min(100, len(new_ids)))]
+        dao.delete_many(batch)
+
+    # порядок важен: сначала чтения, записи и удаления — в конце
+    return {
+        "get_by_id": lambda: dao.get_by_id(rnd.randint(1, rows)),
+        "get_by_ids": lambda: dao.get_by_ids(rnd.sample(range(1, rows + 1), 100)),
+        "max_id": dao.max_id,
+        "get_students_by_faculty": lambda: dao.get_students_by_faculty(rnd.choice(FACULTIES)),
+        "get_unique_courses": dao.get_unique_courses,
+        "get_avg_grade_by_faculty": lambda: dao.get_avg_grade_by_faculty(rnd.choice(FACULTIES)),
+        "get_changes": lambda: dao.get_changes(rnd.randint(0, rows), 1000),
+        "select_all": dao.select_all,
+        "iter_students": lambda: sum(len(p) for p in dao.iter_students({})),
+        "insert": insert,
+        "insert_many": insert_many,
+        "update": lambda: dao.update(rnd.randint(1, rows), {"grade": rnd.randint(0, 100)}),
+        "load_from_csv": lambda: new_ids.extend(range(dao.load_from_csv(csv_file()))),
+        "import_csv": lambda: dao.import_csv(csv_file()),
+        "delete": delete,
+        "delete_many": delete_many,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--calls", type=int, default=300)
+    ap.add_argument("--heavy-calls", type=int, default=5)
+    ap.add_argument("--only", help="методы через запятую")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    dao = StudentsDAO(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    seed(dao, args.rows, chunk=50000)
+    # журнал изменений для get_changes: по записи на каждую строку
+    dao.record_changes("insert", [(i, None) for i in range(1, args.rows + 1)])
+    rnd = random.Random(1)
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for name, fn in cases(dao, args.rows, rnd, tmp).items():
+        if only and name not in only:
+            continue
+        n = args.heavy_calls if name in HEAVY else args.calls
+        samples = []
+        t0 = time.perf_counter()
+        for _ in range(n):
+            t = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t)
+        total = time.perf_counter() - t0
+        results[name] = {"calls": n, **percentiles(samples), "ops_per_s": round(n / total, 1)}
+    write_report({"bench": "dao_micro", "params": vars(args), "results": results, "peak_rss_mb": peak_rss_mb()}, args.out)
+
+if __name__ == "__main__":
+    main()
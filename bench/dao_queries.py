@@ -0,0 +1,71 @@
+# python -m bench.dao_queries --rows 200 --calls 2000
+# Накладные расходы на вызов аналитических методов DAO: прежний путь
+# (новый select(...) + ORM Session на каждый вызов) против заранее собранных запросов + Connection
+import os
+import json
+import time
+import argparse
+import tempfile
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from bench.common import StudentsDAO, Student, seed
+
+class SessionPathDAO(StudentsDAO):
+    def get_students_by_faculty(self, faculty: str) -> List[Tuple[str, str]]:
+        with Session(self.engine) as s:
+            stmt = (
+                select(Student.surname, Student.name)
+                .where(Student.faculty == faculty)
+                .distinct()
+                .order_by(Student.surname, Student.name)
+            )
+            return s.execute(stmt).all()
+
+    def get_unique_courses(self) -> List[str]:
+        with Session(self.engine) as s:
+            stmt = select(Student.course).distinct().order_by(Student.course)
+            return [r[0] for r in s.execute(stmt).all()]
+
+    def get_avg_grade_by_faculty(self, faculty: str) -> Optional[float]:
+        with Session(self.engine) as s:
+            stmt = select(func.avg(Student.grade)).where(Student.faculty == faculty)
+            val = s.execute(stmt).scalar()
+            return float(val) if val is not None else None
+
+def timed(fn, calls: int, rounds: int = 5) -> float:
+    for i in range(min(50, calls)):
+        fn(i)
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for i in range(calls):
+            fn(i)
+        best = min(best, time.perf_counter() - t0)
+    return best / calls * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200)
+    ap.add_argument("--calls", type=int, default=2000)
+    args = ap.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed(StudentsDAO(f"sqlite:///{path}"), args.rows)
+    daos = {"session": SessionPathDAO(f"sqlite:///{path}"), "prepared": StudentsDAO(f"sqlite:///{path}")}
+    # маленькая выборка, чтобы мерить накладные расходы, а не работу SQLite
+    cases = {
+        "get_avg_grade_by_faculty": lambda d: lambda i: d.get_avg_grade_by_faculty("нет такого"),
+        "get_students_by_faculty": lambda d: lambda i: d.get_students_by_faculty("нет такого"),
+        "get_unique_courses": lambda d: lambda i: d.get_unique_courses(),
+    }
+    results = {}
+    for name, make in cases.items():
+        per = {label: round(timed(make(d), args.calls), 1) for label, d in daos.items()}
+        per["speedup"] = round(per["session"] / per["prepared"], 2)
+        results[name] = per
+    print(json.dumps({"bench": "dao_queries", "unit": "us/call", "params": vars(args), "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
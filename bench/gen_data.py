@@ -0,0 +1,30 @@
+# python -m bench.gen_data --rows 1000000 --out students_1m.csv
+# Синтетический students.csv нужного размера (10^6–10^7 строк): значения полей
+# берутся из исходного файла, оценки — случайные; сид фиксирован
+import os
+import argparse
+
+from bench.common import write_csv
+from end_homework_for_2ppa import read_csv_rows
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def vocab_from(path: str) -> dict:
+    vocab = {"surname": set(), "name": set(), "faculty": set(), "course": set()}
+    for row in read_csv_rows(path):
+        for k, values in vocab.items():
+            values.add(row[k])
+    return {k: sorted(v) for k, v in vocab.items()}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000000)
+    ap.add_argument("--out", default="students_big.csv")
+    ap.add_argument("--source", default=os.path.join(ROOT, "students.csv"))
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    write_csv(args.out, args.rows, args.seed, vocab=vocab_from(args.source))
+    print(f"{args.out}: {args.rows} rows, {os.path.getsize(args.out)} bytes")
+
+if __name__ == "__main__":
+    main()
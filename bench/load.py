@@ -0,0 +1,168 @@
+# python -m bench.load --rows 100000 --requests 500 --concurrency 16 --out load.json
+# Нагрузочный прогон Students API внутри процесса: httpx + ASGITransport, без
+# сети и без сервера. Каждый эндпоинт гоняется с кэшем и без. По умолчанию
+# REDIS_URL указывает на закрытый порт и кэш — локальный _InMemoryCache
+# (режим cache_local); с --redis-url и живым Redis режим называется
+# cache_redis. Кэш сбрасывается между прогонами — не натравливать на боевой Redis
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_tmp, 'bench.db')}")
+
+import httpx
+
+from bench.common import FACULTIES, COURSES, seed, write_csv, percentiles, peak_rss_mb, write_report
+import end_homework_for_2ppa as app_module
+
+# тяжёлые эндпоинты (вся таблица) гоняются меньшим числом запросов
+HEAVY = {"GET /students", "GET /export/students"}
+# бесконечный SSE-поток: ASGITransport копит тело целиком, замерить нечем
+SKIPPED = {"GET /changes/stream": "infinite SSE stream; ASGITransport buffers the whole body"}
+
+def scenarios(rows: int, counter, csv_path: str, upload_body: bytes) -> list:
+    rid = lambda: 1 + next(counter) % rows
+    fac = lambda: FACULTIES[next(counter) % len(FACULTIES)]
+    created = []
+
+    def new_student():
+        i = next(counter)
+        return {"surname": f"L{i}", "name": "N", "faculty": FACULTIES[i % len(FACULTIES)], "course": COURSES[i % len(COURSES)], "grade": i % 101}
+
+    async def post_student(c, h):
+        r = await c.post("/students", headers=h, json=new_student())
+        if r.status_code == 200:
+            created.append(r.json()["id"])
+        return r
+
+    async def delete_student(c, h):
+        return await c.delete(f"/students/{created.pop() if created else rid()}", headers=h)
+
+    uploads, fresh = [], []
+
+    async def create_upload(c, h):
+        r = await c.post("/uploads", headers=h)
+        if r.status_code == 200:
+            uploads.append(r.json()["upload_id"])
+            fresh.append(uploads[-1])
+        return r
+
+    async def get_upload(c, h):
+        if not uploads:
+            await create_upload(c, h)
+        return await c.get(f"/uploads/{uploads[next(counter) % len(uploads)]}", headers=h)
+
+    # тело целиком одним куском в свежую загрузку; без POST /uploads в
+    # прогоне загрузка создаётся тут же и попадает в замер
+    async def put_upload(c, h):
+        if not fresh:
+            await create_upload(c, h)
+        return await c.put(f"/uploads/{fresh.pop()}", headers=h, params={"offset": 0, "final": True}, content=upload_body)
+
+    async def register(c, h):
+        return await c.post("/auth/register", json={"username": f"bench{next(counter)}", "password": "p"})
+
+    # (имя, корутина запроса) — сначала чтения, потом записи
+    return [
+        ("GET /students", lambda c, h: c.get("/students", headers=h)),
+        ("GET /students/batch", lambda c, h: c.get("/students/batch", headers=h, params=[("ids", rid()) for _ in range(50)])),
+        ("GET /students/{id}", lambda c, h: c.get(f"/students/{rid()}", headers=h)),
+        ("GET /faculties/{faculty}/students", lambda c, h: c.get(f"/faculties/{fac()}/students", headers=h)),
+        ("GET /faculties/{faculty}/avg", lambda c, h: c.get(f"/faculties/{fac()}/avg", headers=h)),
+        ("GET /courses", lambda c, h: c.get("/courses", headers=h)),
+        ("GET /changes", lambda c, h: c.get("/changes", headers=h, params={"since": rid(), "limit": 100})),
+        ("GET /cache/stats", lambda c, h: c.get("/cache/stats", headers=h)),
+        ("GET /export/students", lambda c, h: c.get("/export/students", headers=h, params={"format": "csv"})),
+        ("POST /auth/register", register),
+        ("POST /auth/login", lambda c, h: c.post("/auth/login", json={"username": "bench", "password": "bench"})),
+        ("POST /auth/logout", lambda c, h: c.post("/auth/logout", headers={"Authorization": "Bearer unknown"})),
+        ("POST /students", post_student),
+        ("PUT /students/{id}", lambda c, h: c.put(f"/students/{rid()}", headers=h, json=new_student())),
+        ("PATCH /students/{id}", lambda c, h: c.patch(f"/students/{rid()}", headers=h, json={"grade": next(counter) % 101})),
+        ("DELETE /students/{id}", delete_student),
+        ("POST /uploads", create_upload),
+        ("GET /uploads/{id}", get_upload),
+        ("PUT /uploads/{id}", put_upload),
+        ("POST /students/upload", lambda c, h: c.post("/students/upload", headers=h, content=upload_body)),
+        ("POST /tasks/load_csv", lambda c, h: c.post("/tasks/load_csv", headers=h, params={"path": csv_path})),
+        ("POST /tasks/delete_many", lambda c, h: c.post("/tasks/delete_many", headers=h, json={"ids": [rid() for _ in range(20)]})),
+    ]
+
+async def run_one(client, headers, fn, requests: int, concurrency: int) -> dict:
+    samples, statuses = [], {}
+    left = iter(range(requests))
+
+    async def worker():
+        for _ in left:
+            t = time.perf_counter()
+            r = await fn(client, headers)
+            samples.append(time.perf_counter() - t)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    total = time.perf_counter() - t0
+    return {
+        "requests": requests,
+        **percentiles(samples),
+        "rps": round(requests / total, 1),
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+async def main_async(args) -> dict:
+    csv_path = os.path.join(_tmp, "load.csv")
+    write_csv(csv_path, 200)
+    upload_path = os.path.join(_tmp, "upload.csv")
+    write_csv(upload_path, 200, seed_value=2)
+    with open(upload_path, "rb") as f:
+        upload_body = f.read()
+    counter = iter(range(10**9))
+    report = {"bench": "load", "params": vars(args), "skipped": SKIPPED, "modes": {}}
+    transport = httpx.ASGITransport(app=app_module.app)
+    if args.redis_url:
+        app_module.REDIS_URL = args.redis_url
+    async with app_module.app.router.lifespan_context(app_module.app):
+        cached = "cache_local" if isinstance(app_module.rds, app_module._InMemoryCache) else "cache_redis"
+        report["cache_backend"] = cached
+        # dao создаётся на старте приложения
+        seed(app_module.dao, args.rows, chunk=50000)
+        app_module.dao.record_changes("insert", [(i, None) for i in range(1, args.rows + 1)])
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await client.post("/auth/register", json={"username": "bench", "password": "bench"})
+            token = (await client.post("/auth/login", json={"username": "bench", "password": "bench"})).json()["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for mode, enabled in ((cached, True), ("cache_off", False)):
+                app_module.CACHE_ENABLED = enabled
+                app_module.cache_clear_all()
+                results = {}
+                for name, fn in scenarios(args.rows, counter, csv_path, upload_body):
+                    if args.only and name not in args.only:
+                        continue
+                    n = args.heavy_requests if name in HEAVY else args.requests
+                    results[name] = await run_one(client, headers, fn, n, args.concurrency)
+                    print(f"{mode} {name}: {results[name]['p50_ms']} ms p50, {results[name]['rps']} rps", file=sys.stderr)
+                report["modes"][mode] = {"endpoints": results, "peak_rss_mb": peak_rss_mb()}
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--heavy-requests", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--only", type=lambda s: set(s.split(",")), help="эндпоинты через запятую, как в отчёте")
+    ap.add_argument("--redis-url", help="живой Redis вместо локального кэша")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    report = asyncio.run(main_async(args))
+    report["params"]["only"] = sorted(args.only) if args.only else None
+    write_report(report, args.out)
+
+if __name__ == "__main__":
+    main()
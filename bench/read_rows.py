@@ -0,0 +1,71 @@
+# python -m bench.read_rows --rows 1000000
+# Чтение всей таблицы и сериализация в JSON: ORM Student -> StudentOut -> dict
+# (прежний путь GET /students) против StudentRow прямо из Core execute()
+import os
+import gc
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from bench.common import StudentsDAO, Student, seed
+from end_homework_for_2ppa import StudentOut
+
+def orm_rows(dao: StudentsDAO) -> list:
+    with Session(dao.engine) as s:
+        return list(s.scalars(select(Student).order_by(Student.id)))
+
+def orm_payload(rows: list) -> list:
+    data = [StudentOut(id=r.id, surname=r.surname, name=r.name, faculty=r.faculty, course=r.course, grade=r.grade) for r in rows]
+    return [d.model_dump() for d in data]
+
+def lite_rows(dao: StudentsDAO) -> list:
+    return dao.select_all()
+
+def lite_payload(rows: list) -> list:
+    return [r._asdict() for r in rows]
+
+def measure(dao: StudentsDAO, load, payload, rows: int) -> dict:
+    gc.collect()
+    t0 = time.perf_counter()
+    recs = load(dao)
+    t1 = time.perf_counter()
+    body = json.dumps(payload(recs), ensure_ascii=False).encode("utf-8")
+    t2 = time.perf_counter()
+    del recs, body
+    # память отдельным прогоном: tracemalloc сильно замедляет выполнение
+    gc.collect()
+    tracemalloc.start()
+    recs = load(dao)
+    held = tracemalloc.get_traced_memory()[0]
+    body = json.dumps(payload(recs), ensure_ascii=False).encode("utf-8")
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del recs, body
+    return {
+        "fetch_s": round(t1 - t0, 3),
+        "serialize_s": round(t2 - t1, 3),
+        "us_per_row": round((t2 - t0) / rows * 1e6, 2),
+        "rows_bytes_per_row": round(held / rows, 1),
+        "peak_bytes_per_row": round(peak / rows, 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000000)
+    args = ap.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    dao = StudentsDAO(f"sqlite:///{path}")
+    seed(dao, args.rows, chunk=50000)
+    results = {
+        "orm": measure(dao, orm_rows, orm_payload, args.rows),
+        "student_row": measure(dao, lite_rows, lite_payload, args.rows),
+    }
+    print(json.dumps({"bench": "read_rows", "params": vars(args), "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
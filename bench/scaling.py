@@ -0,0 +1,133 @@
+# python -m bench.scaling --workers 1,2,4 --duration 10 --out scaling.json
+# Масштабирование serve.py по числу воркеров: для каждого N поднимается
+# настоящий сервер на файловой SQLite, нагрузку по HTTP (keep-alive) дают
+# --clients процессов. Клиенты делят ядра с сервером — для честных цифр их
+# лучше запускать с другой машины: --url http://host:port (сервер не поднимается)
+import os
+import sys
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+import httpx
+
+from bench.common import StudentsDAO, FACULTIES, seed, percentiles, write_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# имя -> случайный путь запроса
+SCENARIOS = {
+    "student_by_id": lambda rnd, rows: f"/students/{rnd.randint(1, rows)}",
+    "faculty_avg": lambda rnd, rows: f"/faculties/{rnd.choice(FACULTIES)}/avg",
+}
+
+def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/metrics", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not start")
+
+def login(url: str) -> dict:
+    with httpx.Client(base_url=url) as c:
+        c.post("/auth/register", json={"username": "bench", "password": "bench"})
+        token = c.post("/auth/login", json={"username": "bench", "password": "bench"}).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+async def _drive(url: str, headers: dict, scenario: str, rows: int, duration: float, concurrency: int, seed_value: int):
+    rnd = random.Random(seed_value)
+    path = SCENARIOS[scenario]
+    samples, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as c:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                t = time.perf_counter()
+                r = await c.get(path(rnd, rows))
+                samples.append(time.perf_counter() - t)
+                if r.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors
+
+def drive(job: tuple):
+    return asyncio.run(_drive(*job))
+
+def measure(url: str, headers: dict, scenario: str, args) -> dict:
+    jobs = [(url, headers, scenario, args.rows, args.duration, args.concurrency, i) for i in range(args.clients)]
+    with multiprocessing.Pool(args.clients) as pool:
+        parts = pool.map(drive, jobs)
+    samples = [s for part, _ in parts for s in part]
+    return {
+        "requests": len(samples),
+        "errors": sum(e for _, e in parts),
+        "rps": round(len(samples) / args.duration, 1),
+        **percentiles(samples),
+    }
+
+def start_server(workers: int, port: int, db_url: str) -> subprocess.Popen:
+    env = {**os.environ, "DB_URL": db_url, "REDIS_URL": os.getenv("REDIS_URL", "redis://localhost:1/0"), "METRICS_ENABLED": "1"}
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4])
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--concurrency", type=int, default=32, help="соединений на клиентский процесс")
+    ap.add_argument("--only", type=lambda s: set(s.split(",")))
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--url", help="уже запущенный сервер; --workers тогда только подпись в отчёте")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    report = {"bench": "scaling", "params": {**vars(args), "only": sorted(args.only) if args.only else None}, "cpu_count": os.cpu_count(), "runs": {}}
+    db_url = None
+    if not args.url:
+        db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'scaling.db')}"
+        dao = StudentsDAO(db_url)
+        seed(dao, args.rows, chunk=50000)
+        dao.close()
+    for n in args.workers:
+        server = None if args.url else start_server(n, args.port, db_url)
+        url = args.url or f"http://127.0.0.1:{args.port}"
+        try:
+            wait_ready(url)
+            headers = login(url)
+            run = {}
+            for scenario in SCENARIOS:
+                if args.only and scenario not in args.only:
+                    continue
+                run[scenario] = measure(url, headers, scenario, args)
+                print(f"workers={n} {scenario}: {run[scenario]['rps']} rps, p50 {run[scenario]['p50_ms']} ms, p99 {run[scenario]['p99_ms']} ms", file=sys.stderr)
+            report["runs"][str(n)] = run
+        finally:
+            if server is not None:
+                server.send_signal(signal.SIGTERM)
+                server.wait(60)
+    # эффективность: rps(N) / (N * rps(1)); 1.0 — линейный рост
+    base = report["runs"].get(str(args.workers[0]), {})
+    report["efficiency"] = {
+        str(n): {s: round(r["rps"] * args.workers[0] / (n * base[s]["rps"]), 2) for s, r in report["runs"][str(n)].items() if base.get(s, {}).get("rps")}
+        for n in args.workers
+    }
+    write_report(report, args.out)
+
+if __name__ == "__main__":
+    main()
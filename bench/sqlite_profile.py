@@ -0,0 +1,76 @@
+# python -m bench.sqlite_profile --rows 50000 --readers 8 --writers 2 --seconds 5
+# Конкурентные чтения/записи на файловой SQLite: настройки по умолчанию против профиля (WAL и т.д.)
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+from bench.common import StudentsDAO, FACULTIES, COURSES, seed
+
+def run(tuned: bool, rows: int, readers: int, writers: int, seconds: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    dao = StudentsDAO(f"sqlite:///{path}", tuned=tuned)
+    seed(dao, rows)
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        rnd = random.Random()
+        n = 0
+        while not stop.is_set():
+            try:
+                dao.get_avg_grade_by_faculty(rnd.choice(FACULTIES))
+                dao.get_by_id(rnd.randint(1, rows))
+                n += 2
+            except Exception:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["reads"] += n
+
+    def writer():
+        rnd = random.Random()
+        n = 0
+        while not stop.is_set():
+            try:
+                dao.insert("W", "W", rnd.choice(FACULTIES), rnd.choice(COURSES), rnd.randint(0, 100))
+                n += 1
+            except Exception:
+                with lock:
+                    counts["errors"] += 1
+        with lock:
+            counts["writes"] += n
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer) for _ in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    dao.engine.dispose()
+    return {
+        "profile": "tuned" if tuned else "default",
+        "reads_per_s": round(counts["reads"] / elapsed, 1),
+        "writes_per_s": round(counts["writes"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50000)
+    ap.add_argument("--readers", type=int, default=8)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--seconds", type=float, default=5)
+    args = ap.parse_args()
+    results = [run(tuned, args.rows, args.readers, args.writers, args.seconds) for tuned in (False, True)]
+    print(json.dumps({"bench": "sqlite_profile", "params": vars(args), "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# python -m bench.startup --runs 10 --out startup.json
+# Холодный старт воркера: каждый прогон — новый процесс, в нём по фазам
+# импорт модуля, lifespan (БД, схема, Redis) и первый запрос к БД.
+# --src — каталог с другой версией приложения (например, git worktree) для сравнения
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bench.common import write_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import sys, time, json, asyncio
+import httpx
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import end_homework_for_2ppa as m
+t1 = time.perf_counter()
+
+async def main():
+    async with m.app.router.lifespan_context(m.app):
+        t2 = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=m.app), base_url="http://bench") as c:
+            await c.post("/auth/login", json={"username": "nobody", "password": "x"})
+        return t2, time.perf_counter()
+
+t2, t3 = asyncio.run(main())
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000, "first_request_ms": (t3 - t2) * 1000}))
+"""
+
+# имя -> (свежая ли БД на каждый прогон, REDIS_URL)
+SCENARIOS = {
+    "fresh_db": (True, "redis://localhost:1/0"),
+    "existing_db": (False, "redis://localhost:1/0"),
+    # немаршрутизируемый адрес: соединение не отвергается, а висит до таймаута
+    "redis_blackhole": (False, "redis://10.255.255.1:6379/0"),
+}
+
+def run_once(src: str, db_url: str, redis_url: str, timeout: float) -> dict:
+    env = {**os.environ, "DB_URL": db_url, "REDIS_URL": redis_url}
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, src], env=env, capture_output=True, text=True, timeout=timeout, cwd=src)
+    wall = (time.perf_counter() - t0) * 1000
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    return {**json.loads(out.stdout.strip().splitlines()[-1]), "process_ms": wall}
+
+def summary(samples: list) -> dict:
+    return {
+        phase: {"min": round(min(vals), 1), "median": round(statistics.median(vals), 1), "max": round(max(vals), 1)}
+        for phase in samples[0]
+        for vals in [[s[phase] for s in samples]]
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--src", default=ROOT)
+    ap.add_argument("--only", type=lambda s: set(s.split(",")))
+    ap.add_argument("--timeout", type=float, default=180)
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    report = {"bench": "startup", "params": {**vars(args), "only": sorted(args.only) if args.only else None}, "scenarios": {}}
+    for name, (fresh, redis_url) in SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        shared = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+        if not fresh:
+            run_once(args.src, shared, "redis://localhost:1/0", args.timeout)
+        samples = []
+        for i in range(args.runs):
+            db_url = f"sqlite:///{os.path.join(tmp, f'{name}_{i}.db')}" if fresh else shared
+            samples.append(run_once(args.src, db_url, redis_url, args.timeout))
+        report["scenarios"][name] = summary(samples)
+        med = report["scenarios"][name]
+        print(f"{name}: import {med['import_ms']['median']} ms, startup {med['startup_ms']['median']} ms, "
+              f"first request {med['first_request_ms']['median']} ms, process {med['process_ms']['median']} ms", file=sys.stderr)
+    write_report(report, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Политика кэширования для end_homework_for_2ppa: канонические ключи,
+# TTL и лимиты по маршрутам, сжатие крупных значений
+import os
+import zlib
+import unicodedata
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, quote
+
+KEY_PREFIX = "cache:"
+COMPRESSED_MARKER = b"z"  # JSON не может начинаться с "z"
+COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+
+class RoutePolicy(NamedTuple):
+    ttl: int = 60
+    max_bytes: int = 1024 * 1024
+    compress_min_bytes: Optional[int] = None
+
+DEFAULT_POLICY = RoutePolicy()
+
+# ключ — шаблон маршрута FastAPI (request.scope["route"].path)
+POLICIES: Dict[str, RoutePolicy] = {
+    "/courses": RoutePolicy(ttl=3600, max_bytes=256 * 1024),
+    "/students": RoutePolicy(ttl=60, max_bytes=64 * 1024 * 1024, compress_min_bytes=16 * 1024),
+    "/students/{student_id}": RoutePolicy(ttl=300, max_bytes=4 * 1024),
+    "/faculties/{faculty}/students": RoutePolicy(ttl=300, max_bytes=4 * 1024 * 1024, compress_min_bytes=16 * 1024),
+    "/faculties/{faculty}/avg": RoutePolicy(ttl=300, max_bytes=4 * 1024),
+}
+
+def normalize_text(s: str) -> str:
+    return unicodedata.normalize("NFC", s)
+
+def canonical_key(path: str, query: str = "") -> str:
+    params = sorted((normalize_text(k), normalize_text(v)) for k, v in parse_qsl(query, keep_blank_values=True))
+    return f"{KEY_PREFIX}{quote(normalize_text(path))}?{urlencode(params, quote_via=quote)}"
+
+def policy_for(route_path: Optional[str]) -> RoutePolicy:
+    return POLICIES.get(route_path, DEFAULT_POLICY)
+
+def encode_value(payload: bytes, policy: RoutePolicy) -> Optional[bytes]:
+    if len(payload) > policy.max_bytes:
+        return None
+    if policy.compress_min_bytes is not None and len(payload) >= policy.compress_min_bytes:
+        return COMPRESSED_MARKER + zlib.compress(payload, COMPRESS_LEVEL)
+    return payload
+
+def decode_value(stored: bytes) -> bytes:
+    if stored[:1] == COMPRESSED_MARKER:
+        return zlib.decompress(stored[1:])
+    return stored
@@ -0,0 +1,61 @@
+# Инкрементальный разбор CSV из потока байтов: распаковка gzip, декодирование
+# и разбиение на записи идут кусками, в памяти только хвост незавершённой записи
+import io
+import csv
+import zlib
+import codecs
+from typing import Iterable, List, Optional
+
+class CsvStreamParser:
+    def __init__(self, encoding: str = "utf-8-sig", gzip: bool = False):
+        # wbits 47 = 32 + 15: заголовок gzip или zlib определяется автоматически
+        self.decompressor = zlib.decompressobj(47) if gzip else None
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.tail = ""
+        self.scanned = 0      # сколько символов хвоста уже просмотрено
+        self.quoted = False   # внутри кавычек в просмотренной части хвоста
+        self.header: Optional[List[str]] = None
+
+    def feed(self, data: bytes, final: bool = False) -> List[List[str]]:
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+            if final:
+                data += self.decompressor.flush()
+                if not self.decompressor.eof:
+                    raise ValueError("truncated gzip stream")
+        buf = self.tail + self.decoder.decode(data, final)
+        if final:
+            complete, self.tail, self.scanned, self.quoted = buf, "", 0, False
+        else:
+            # запись кончается на переводе строки вне кавычек; "" внутри поля
+            # меняет чётность дважды, так что считать кавычки достаточно
+            i, cut, quoted = self.scanned, 0, self.quoted
+            while True:
+                j = buf.find("\n", i)
+                if j < 0:
+                    break
+                quoted ^= buf.count('"', i, j) & 1
+                i = j + 1
+                if not quoted:
+                    cut = i
+            complete, self.tail, self.scanned, self.quoted = buf[:cut], buf[cut:], i - cut, quoted
+        if not complete:
+            return []
+        rows = [r for r in csv.reader(io.StringIO(complete, newline="")) if r]
+        if self.header is None and rows:
+            self.header = rows.pop(0)
+        return rows
+
+    # Состояние для продолжения в другом процессе. Распаковщик zlib не
+    # сериализуется: restore восстанавливает его, заново прогнав через
+    # новый распаковщик уже принятые сжатые байты (их вывод уже учтён)
+    def checkpoint(self) -> dict:
+        buffered, flag = self.decoder.getstate()
+        return {"decoder": [buffered.hex(), flag], "tail": self.tail, "scanned": self.scanned, "quoted": self.quoted, "header": self.header}
+
+    def restore(self, state: dict, compressed: Iterable[bytes] = ()):
+        self.decoder.setstate((bytes.fromhex(state["decoder"][0]), state["decoder"][1]))
+        self.tail, self.scanned, self.quoted, self.header = state["tail"], state["scanned"], state["quoted"], state["header"]
+        if self.decompressor is not None:
+            for part in compressed:
+                self.decompressor.decompress(part)
@@ -0,0 +1,135 @@
+# Потоковая выгрузка таблицы: кодирование чанков строк в CSV/NDJSON/Arrow/Parquet
+# и необязательное сжатие. Память ограничена одним чанком, формат не важен
+import io
+import csv
+import json
+import zlib
+import importlib
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+# pyarrow (~0.1 с на импорт) и zstandard грузятся при первой выгрузке,
+# которой они нужны, а не при старте воркера
+_modules: dict = {}
+
+def _optional(name: str):
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+FORMATS = {
+    # формат -> (media type, расширение, нужен ли pyarrow)
+    "csv": ("text/csv; charset=utf-8", "csv", False),
+    "ndjson": ("application/x-ndjson", "ndjson", False),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow", True),
+    "parquet": ("application/vnd.apache.parquet", "parquet", True),
+}
+COMPRESSIONS = {
+    "gzip": ("application/gzip", "gz"),
+    "zstd": ("application/zstd", "zst"),
+}
+
+def unavailable(fmt: str, compress: Optional[str]) -> Optional[str]:
+    if FORMATS[fmt][2] and (_optional("pyarrow.ipc") is None or _optional("pyarrow.parquet") is None):
+        return f"{fmt} export needs pyarrow"
+    if compress == "zstd" and _optional("zstandard") is None:
+        return "zstd compression needs zstandard"
+    return None
+
+class _Sink:
+    # файловый объект для pyarrow: копит записанное, пока генератор его не заберёт
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        b = bytes(b)
+        self.parts.append(b)
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+def _csv_chunks(columns: Sequence[str], chunks: Iterable[list]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(columns)
+    for rows in chunks:
+        w.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+def _ndjson_chunks(columns: Sequence[str], chunks: Iterable[list]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, r)), ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+def _record_batch(schema, rows: list):
+    pa = _optional("pyarrow")
+    cols = list(zip(*rows)) if rows else [[] for _ in schema.names]
+    return pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema)
+
+def _arrow_chunks(schema, chunks: Iterable[list]) -> Iterator[bytes]:
+    sink = _Sink()
+    with _optional("pyarrow.ipc").new_stream(sink, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(_record_batch(schema, rows))
+            yield sink.drain()
+    yield sink.drain()
+
+def _parquet_chunks(schema, chunks: Iterable[list]) -> Iterator[bytes]:
+    # каждый чанк — отдельная row group, футер дописывается при закрытии
+    sink = _Sink()
+    with _optional("pyarrow.parquet").ParquetWriter(sink, schema, compression="snappy") as writer:
+        for rows in chunks:
+            writer.write_batch(_record_batch(schema, rows))
+            yield sink.drain()
+    yield sink.drain()
+
+def _compressed(parts: Iterator[bytes], compress: Optional[str]) -> Iterator[bytes]:
+    if compress is None:
+        yield from parts
+        return
+    if compress == "gzip":
+        co = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        co = _optional("zstandard").ZstdCompressor(level=3).compressobj()
+    for part in parts:
+        out = co.compress(part)
+        if out:
+            yield out
+    yield co.flush()
+
+def encode(fmt: str, columns: Sequence[str], arrow_types: Sequence[str], chunks: Iterable[list], compress: Optional[str] = None) -> Iterator[bytes]:
+    if fmt == "csv":
+        parts = _csv_chunks(columns, chunks)
+    elif fmt == "ndjson":
+        parts = _ndjson_chunks(columns, chunks)
+    else:
+        schema = _optional("pyarrow").schema([(c, t) for c, t in zip(columns, arrow_types)])
+        parts = (_arrow_chunks if fmt == "arrow" else _parquet_chunks)(schema, chunks)
+    return (p for p in _compressed(parts, compress) if p)
+
+def content_type(fmt: str, compress: Optional[str]) -> str:
+    return COMPRESSIONS[compress][0] if compress else FORMATS[fmt][0]
+
+def filename(base: str, fmt: str, compress: Optional[str]) -> str:
+    name = f"{base}.{FORMATS[fmt][1]}"
+    return f"{name}.{COMPRESSIONS[compress][1]}" if compress else name
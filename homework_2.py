@@ -2,16 +2,198 @@
 import os
 import re
 import json
+import math
+import struct
+import hashlib
+import sqlite3
+import asyncio
 import uvicorn
-from uuid import uuid4
+from uuid import uuid4, UUID
 from datetime import date
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, EmailStr, field_validator
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, HTTPException, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, ValidationError, field_validator
 
-app = FastAPI()
+DATA_DIR = "data"
+INDEX_PATH = os.path.join(DATA_DIR, "index.sqlite3")
+BLOOM_PATH = os.path.join(DATA_DIR, "bloom.bin")
+INDEX_SCHEMA_VERSION = 3
 
-CYRILLIC_NAME_RE = r"^[А-ЯЁ][а-яё]+$"
-PHONE_RE = r"^\+?\d{10,15}$"
+CYRILLIC_NAME_RE = re.compile(r"^[А-ЯЁ][а-яё]+$")
+PHONE_RE = re.compile(r"^\+?\d{10,15}$")
+
+BULK_BATCH_SIZE = 1000
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = 0.01
+
+# Вторичные индексы по обращениям: файлы в data/ остаются источником правды,
+# а SQLite-индекс (B-tree) даёт поиск по id/телефону/email/фамилии за O(log n)
+index_db: Optional[sqlite3.Connection] = None
+
+def open_index() -> sqlite3.Connection:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db = sqlite3.connect(INDEX_PATH, check_same_thread=False)
+    # индекс производный: при смене схемы просто строим его заново по файлам
+    if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_SCHEMA_VERSION:
+        db.execute("DROP TABLE IF EXISTS appeals")
+        db.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS appeals ("
+        "id TEXT PRIMARY KEY, surname TEXT NOT NULL, name TEXT NOT NULL, "
+        "birthdate TEXT NOT NULL, phone TEXT NOT NULL, email TEXT NOT NULL, "
+        "content_hash TEXT NOT NULL, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL)"
+    )
+    # ключи идемпотентности есть только здесь, поэтому таблица не пересоздаётся
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+        "key TEXT PRIMARY KEY, appeal_id TEXT NOT NULL, content_hash TEXT)"
+    )
+    # старые ключи хранились без хэша тела — добавляем колонку и берём хэш из индекса
+    if "content_hash" not in {r[1] for r in db.execute("PRAGMA table_info(idempotency_keys)")}:
+        db.execute("ALTER TABLE idempotency_keys ADD COLUMN content_hash TEXT")
+    db.execute(
+        "UPDATE idempotency_keys SET content_hash = "
+        "(SELECT content_hash FROM appeals WHERE appeals.id = idempotency_keys.appeal_id) "
+        "WHERE content_hash IS NULL"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS ix_appeals_phone ON appeals (phone)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_appeals_email ON appeals (email)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_appeals_surname ON appeals (surname)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_appeals_content_hash ON appeals (content_hash)")
+    db.commit()
+    return db
+
+def content_hash(payload: dict) -> str:
+    parts = (
+        payload["surname"],
+        payload["name"],
+        payload["birthdate"],
+        payload["phone"],
+        payload["email"].lower(),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+# mtime и размер файла: по ним sync_index замечает правки data/ в обход API
+def index_row(file_id: str, payload: dict, st: os.stat_result) -> tuple:
+    return (
+        file_id,
+        payload["surname"],
+        payload["name"],
+        payload["birthdate"],
+        payload["phone"],
+        payload["email"],
+        content_hash(payload),
+        st.st_mtime_ns,
+        st.st_size,
+    )
+
+INSERT_INDEX_SQL = "INSERT OR REPLACE INTO appeals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+def sync_index(db: sqlite3.Connection) -> None:
+    indexed = {r[0]: (r[1], r[2]) for r in db.execute("SELECT id, mtime_ns, size FROM appeals")}
+    stale, rows = set(indexed), []
+    for entry in os.scandir(DATA_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        file_id = entry.name[:-5]
+        try:
+            st = entry.stat()
+            if indexed.get(file_id) == (st.st_mtime_ns, st.st_size):
+                stale.discard(file_id)
+                continue
+            with open(entry.path, encoding="utf-8") as f:
+                rows.append(index_row(file_id, json.load(f), st))
+            stale.discard(file_id)
+        except (OSError, ValueError, KeyError):
+            # удалённый или испорченный файл из индекса убираем
+            continue
+    if stale:
+        db.executemany("DELETE FROM appeals WHERE id = ?", [(i,) for i in stale])
+    if rows:
+        db.executemany(INSERT_INDEX_SQL, rows)
+    db.commit()
+
+# Фильтр Блума перед точной проверкой в индексе: отрицательный ответ
+# (подавляющее большинство запросов) не стоит ни одного обращения к диску
+class BloomFilter:
+    MAGIC = b"BLM1"
+    HEADER = struct.Struct("<4sQQ4Q")
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.m = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key: str):
+        d = hashlib.sha256(key.encode("utf-8")).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:16], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def save(self, path: str, stamp: tuple) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.m, self.k, *stamp))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            magic, m, k, *stamp = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            bits = bytearray(f.read())
+        if magic != cls.MAGIC or len(bits) != (m + 7) // 8:
+            raise ValueError("bad bloom file")
+        bf = cls.__new__(cls)
+        bf.m, bf.k, bf.bits = m, k, bits
+        return bf, tuple(stamp)
+
+bloom: Optional[BloomFilter] = None
+
+def index_stamp(db: sqlite3.Connection) -> tuple:
+    a = db.execute("SELECT count(*), coalesce(max(rowid), 0) FROM appeals").fetchone()
+    k = db.execute("SELECT count(*), coalesce(max(rowid), 0) FROM idempotency_keys").fetchone()
+    return (*a, *k)
+
+def load_bloom(db: sqlite3.Connection) -> BloomFilter:
+    stamp = index_stamp(db)
+    try:
+        bf, saved = BloomFilter.load(BLOOM_PATH)
+        if saved == stamp:
+            return bf
+    except (OSError, ValueError, struct.error):
+        pass
+    # файл устарел (падение процесса, ручная правка data/) — пересобираем по индексу
+    bf = BloomFilter(max(BLOOM_CAPACITY, 2 * (stamp[0] + stamp[2])))
+    for (h,) in db.execute("SELECT content_hash FROM appeals"):
+        bf.add("c:" + h)
+    for (k,) in db.execute("SELECT key FROM idempotency_keys"):
+        bf.add("k:" + k)
+    return bf
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global index_db, bloom
+    index_db = open_index()
+    sync_index(index_db)
+    bloom = load_bloom(index_db)
+    yield
+    bloom.save(BLOOM_PATH, index_stamp(index_db))
+    index_db.close()
+    index_db = None
+    bloom = None
+
+app = FastAPI(lifespan=lifespan)
 
 class Appeal(BaseModel):
     surname: str
@@ -22,50 +204,228 @@ class Appeal(BaseModel):
 
     @field_validator("surname")
     def validate_surname(cls, v: str) -> str:
-        if not re.match(CYRILLIC_NAME_RE, v):
+        if not CYRILLIC_NAME_RE.match(v):
             raise ValueError("Фамилия: с заглавной буквы, только кириллица (пример: Иванов)")
         return v
 
     @field_validator("name")
     def validate_name(cls, v: str) -> str:
-        if not re.match(CYRILLIC_NAME_RE, v):
+        if not CYRILLIC_NAME_RE.match(v):
             raise ValueError("Имя: с заглавной буквы, только кириллица (пример: Иван)")
         return v
 
     @field_validator("phone")
     def validate_phone(cls, v: str) -> str:
-        if not re.match(PHONE_RE, v):
+        if not PHONE_RE.match(v):
             raise ValueError("Телефон: допустим формат + и 10–15 цифр (пример: +79991234567)")
         return v
 
+def row_to_appeal(row: tuple) -> dict:
+    return {
+        "id": row[0],
+        "data": {
+            "surname": row[1],
+            "name": row[2],
+            "birthdate": row[3],
+            "phone": row[4],
+            "email": row[5],
+        },
+    }
+
 @app.get("/")
 async def root():
-    return {"msg": "POST /appeals — создать обращение"}
+    return {"msg": "POST /appeals — создать обращение, POST /appeals/bulk — пакет NDJSON, GET /appeals — поиск"}
 
-@app.post("/appeals")
-async def create_appeal(appeal: Appeal):
-        os.makedirs("data", exist_ok=True)
-        file_id = str(uuid4())
-        path = os.path.join("data", f"{file_id}.json")
-        payload = {
-            "surname": appeal.surname,
-            "name": appeal.name,
-            "birthdate": appeal.birthdate.isoformat(),
-            "phone": appeal.phone,
-            "email": str(appeal.email),
-        }
-        try:
+def appeal_payload(appeal: Appeal) -> dict:
+    return {
+        "surname": appeal.surname,
+        "name": appeal.name,
+        "birthdate": appeal.birthdate.isoformat(),
+        "phone": appeal.phone,
+        "email": str(appeal.email),
+    }
+
+def find_duplicate(payload: dict, idempotency_key: Optional[str] = None) -> Optional[str]:
+    h = content_hash(payload)
+    if idempotency_key and "k:" + idempotency_key in bloom:
+        row = index_db.execute("SELECT appeal_id, content_hash FROM idempotency_keys WHERE key = ?", (idempotency_key,)).fetchone()
+        if row:
+            # тот же ключ с другим телом — ошибка клиента, а не повтор запроса
+            if row[1] is not None and row[1] != h:
+                raise HTTPException(status_code=409, detail="Idempotency-Key уже использован с другим обращением")
+            return row[0]
+    if "c:" + h in bloom:
+        row = index_db.execute("SELECT id FROM appeals WHERE content_hash = ?", (h,)).fetchone()
+        if row:
+            return row[0]
+    return None
+
+def remember_idempotency_key(key: str, appeal_id: str, h: str) -> None:
+    index_db.execute("INSERT OR IGNORE INTO idempotency_keys VALUES (?, ?, ?)", (key, appeal_id, h))
+    index_db.commit()
+    bloom.add("k:" + key)
+
+# ids пополняется по мере записи: при ошибке вызывающий видит, что уже сохранено
+def save_appeals(payloads: List[dict], ids: Optional[List[str]] = None) -> List[str]:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    ids = [] if ids is None else ids
+    rows = []
+    try:
+        for payload in payloads:
+            file_id = str(uuid4())
+            path = os.path.join(DATA_DIR, f"{file_id}.json")
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(payload, f, ensure_ascii=False, indent=2)
+            ids.append(file_id)
+            rows.append(index_row(file_id, payload, os.stat(path)))
+    finally:
+        # индексируем всё, что успело попасть на диск, одной транзакцией
+        if rows:
+            index_db.executemany(INSERT_INDEX_SQL, rows)
+            index_db.commit()
+            for row in rows:
+                bloom.add("c:" + row[6])
+    return ids
+
+# Проверка дубля и запись разделены await (запись идёт в threadpool), поэтому
+# одинаковые запросы сериализуются: лок на хэш содержимого и на ключ. Индекс
+# открыт одним процессом (uvicorn без воркеров), локов процесса достаточно
+_claims: Dict[str, list] = {}  # имя -> [asyncio.Lock, сколько запросов его держат или ждут]
+
+@asynccontextmanager
+async def claim(name: str):
+    entry = _claims.setdefault(name, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _claims[name]
+
+@app.post("/appeals")
+async def create_appeal(appeal: Appeal, idempotency_key: Optional[str] = Header(None)):
+    payload = appeal_payload(appeal)
+    h = content_hash(payload)
+    # порядок фиксирован (сначала хэш, потом ключ) — без взаимных блокировок
+    async with claim("c:" + h), (claim("k:" + idempotency_key) if idempotency_key else nullcontext()):
+        status = "ok"
+        file_id = find_duplicate(payload, idempotency_key)
+        if file_id:
+            status = "duplicate"
+        else:
+            try:
+                file_id = (await run_in_threadpool(save_appeals, [payload]))[0]
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Ошибка записи файла: {e}")
+        if idempotency_key:
+            remember_idempotency_key(idempotency_key, file_id, h)
+
+    path = os.path.join(DATA_DIR, f"{file_id}.json")
+    return {"status": status, "id": file_id, "file": path, "data": payload}
+
+def format_errors(e: ValidationError) -> List[str]:
+    return [".".join(map(str, err["loc"])) + ": " + err["msg"] if err["loc"] else err["msg"] for err in e.errors()]
+
+# NDJSON: одно обращение (JSON-объект) на строку
+@app.post("/appeals/bulk")
+async def create_appeals_bulk(request: Request):
+    ids, errors, duplicates, batch, batch_lines = [], [], [], [], []
+    pending = {}
+    failed = 0
+    lineno = 0
+    tail = b""
+
+    def take(line: bytes):
+        nonlocal lineno
+        lineno += 1
+        if not line.strip():
+            return
+        try:
+            payload = appeal_payload(Appeal.model_validate_json(line))
+        except ValidationError as e:
+            errors.append({"line": lineno, "errors": format_errors(e)})
+            return
+        h = content_hash(payload)
+        if h in pending:
+            duplicates.append({"line": lineno, "same_as_line": pending[h]})
+            return
+        dup = find_duplicate(payload)
+        if dup:
+            duplicates.append({"line": lineno, "id": dup})
+            return
+        pending[h] = lineno
+        batch.append(payload)
+        batch_lines.append(lineno)
+
+    async def flush():
+        nonlocal failed
+        saved = []
+        try:
+            await run_in_threadpool(save_appeals, batch, saved)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Ошибка записи файла: {e}")
+            # записанное остаётся в ответе, несохранённые строки — в ошибках
+            for n in batch_lines[len(saved):]:
+                errors.append({"line": n, "errors": [f"Ошибка записи файла: {e}"]})
+            failed += len(batch_lines) - len(saved)
+        ids.extend(saved)
+        batch.clear()
+        batch_lines.clear()
+        pending.clear()
+
+    async for chunk in request.stream():
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            take(line)
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush()
+    take(tail)
+    await flush()
+
+    return {
+        "status": "partial" if failed else "ok",
+        "accepted": len(ids),
+        "rejected": len(errors) - failed,
+        "duplicate": len(duplicates),
+        "failed": failed,
+        "ids": ids,
+        "errors": errors,
+        "duplicates": duplicates,
+    }
+
+@app.get("/appeals/{appeal_id}")
+async def get_appeal(appeal_id: UUID):
+    row = index_db.execute("SELECT * FROM appeals WHERE id = ?", (str(appeal_id),)).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Обращение не найдено")
+    return row_to_appeal(row)
 
-        return {"status": "ok", "id": file_id, "file": path, "data": payload}
+@app.get("/appeals")
+async def find_appeals(
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    surname: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    where, params = [], []
+    for col, val in (("phone", phone), ("email", email), ("surname", surname)):
+        if val:
+            where.append(f"{col} = ?")
+            params.append(val)
+    sql = "SELECT * FROM appeals"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id LIMIT ? OFFSET ?"
+    rows = index_db.execute(sql, (*params, limit, offset)).fetchall()
+    return {"count": len(rows), "items": [row_to_appeal(r) for r in rows]}
 
 if __name__ == "__main__":
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "homework_2:app",
+        host="0.0.0.0",
+        port=8000,
         reload=True
     )
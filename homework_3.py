@@ -178,8 +178,8 @@ async def avg_by_faculty(faculty: str):
 
 if __name__ == "__main__":
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "homework_3:app",
+        host="0.0.0.0",
+        port=8000,
         reload=True
     )
@@ -299,8 +299,8 @@ async def avg_by_faculty(faculty: str, user_id: int = Depends(get_current_user))
 
 if __name__ == "__main__":
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "homework_5:app",
+        host="0.0.0.0",
+        port=8000,
         reload=True
-        )
+    )
@@ -371,8 +371,8 @@ async def task_delete_many(payload: DeleteManyIn, background: BackgroundTasks =
 
 if __name__ == "__main__":
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "homework_6:app",
+        host="0.0.0.0",
+        port=8000,
         reload=True
-        )
+    )
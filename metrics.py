@@ -0,0 +1,222 @@
+# Метрики в формате Prometheus без внешних зависимостей: счётчики, гистограммы,
+# тайминги стадий запроса через contextvar, ASGI-middleware и события SQLAlchemy
+import time
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values)) + "}"
+
+def _fmt_num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        out += [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_num(v)}" for k, v in items]
+        return out
+
+# значение снимается в момент выдачи /metrics — для очередей и долей
+class Gauge:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), fn: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name, self.doc, self.labels, self.fn = name, doc, tuple(labels), fn
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        if self.fn is not None:
+            items = list(self.fn().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        out += [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_num(v)}" for k, v in items]
+        return out
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels, self.buckets = name, doc, tuple(labels), tuple(buckets)
+        # метка -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def count(self, *label_values: str) -> int:
+        s = self._series.get(label_values)
+        return sum(s[0]) if s else 0
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(s[0]), s[1]) for k, s in self._series.items()]
+        names = self.labels + ("le",)
+        for key, counts, total in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                le = "+Inf" if bound == float("inf") else _fmt_num(bound)
+                out.append(f"{self.name}_bucket{_fmt_labels(names, key + (le,))} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {repr(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {acc}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.add(Counter("http_requests_total", "HTTP requests", ("method", "route", "status")))
+http_latency = REGISTRY.add(Histogram("http_request_duration_seconds", "HTTP request latency, until the last body chunk", ("method", "route")))
+stage_latency = REGISTRY.add(Histogram("http_stage_duration_seconds", "Time spent per request stage", ("route", "stage")))
+db_queries_per_request = REGISTRY.add(Histogram("db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS))
+db_query_latency = REGISTRY.add(Histogram("db_query_duration_seconds", "SQL statement latency (cursor execute)"))
+cache_lookups = REGISTRY.add(Counter("cache_lookups_total", "Response cache lookups", ("result",)))
+cache_hit_ratio = REGISTRY.add(Gauge(
+    "cache_hit_ratio",
+    "Share of response cache lookups that hit since start",
+    fn=lambda: {(): cache_lookups.value("hit") / max(1.0, cache_lookups.value("hit") + cache_lookups.value("miss"))},
+))
+bg_in_flight = REGISTRY.add(Gauge("background_tasks_in_flight", "Background tasks scheduled and not finished", ("task",)))
+bg_latency = REGISTRY.add(Histogram("background_task_duration_seconds", "Background task duration", ("task",)))
+
+# Контекст текущего запроса: маршрут, стадии и счётчик SQL. Словарь общий
+# для корутины и run_in_threadpool (копия контекста ссылается на тот же объект)
+request_ctx: ContextVar[Optional[dict]] = ContextVar("metrics_request", default=None)
+
+class stage:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ctx = request_ctx.get()
+        if ctx is not None:
+            ctx["stages"][self.name] = ctx["stages"].get(self.name, 0.0) + time.perf_counter() - self.t0
+        return False
+
+def route_of(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        ctx = {"stages": {}, "db_queries": 0, "db_time": 0.0}
+        token = request_ctx.set(ctx)
+        status = [500]
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_ctx.reset(token)
+            route = route_of(scope)
+            http_requests.inc(scope["method"], route, str(status[0]))
+            http_latency.observe(time.perf_counter() - t0, scope["method"], route)
+            db_queries_per_request.observe(ctx["db_queries"], route)
+            if ctx["db_queries"]:
+                stage_latency.observe(ctx["db_time"], route, "db")
+            for name, dt in ctx["stages"].items():
+                stage_latency.observe(dt, route, name)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("metrics_t0")
+    if not stack:
+        return
+    dt = time.perf_counter() - stack.pop()
+    db_query_latency.observe(dt)
+    ctx = request_ctx.get()
+    if ctx is not None:
+        ctx["db_queries"] += 1
+        ctx["db_time"] += dt
+
+_instrumented = False
+
+# на класс Engine — покрывает основной движок, реплики и шарды разом
+def instrument_sqlalchemy():
+    global _instrumented
+    if _instrumented:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _instrumented = True
+
+def track_background(task: str, fn: Callable):
+    # счётчик «в полёте» растёт при постановке задачи, а не при старте
+    bg_in_flight.add(task)
+
+    def run(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            bg_latency.observe(time.perf_counter() - t0, task)
+            bg_in_flight.add(task, amount=-1)
+    return run
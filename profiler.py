@@ -0,0 +1,73 @@
+# Сэмплирующий профайлер для живого процесса: отдельный поток раз в interval
+# снимает стеки всех потоков (sys._current_frames) и копит их в свёрнутом
+# виде "поток;внешняя;...;внутренняя N" — вход для flamegraph.pl/speedscope
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+MAX_DEPTH = 128
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame, thread_name: str) -> str:
+    parts = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts)).replace("\n", " ")
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    # блокирует вызывающий поток на seconds; параллельный запуск — ProfilerBusy
+    def run(self, seconds: float, interval: float = 0.01, thread_filter: Optional[str] = None) -> dict:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._sample(seconds, interval, thread_filter)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, thread_filter: Optional[str]) -> dict:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_tick = started
+        while time.perf_counter() < deadline:
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                if thread_filter and thread_filter not in name:
+                    continue
+                stacks[_collapse(frame, name)] += 1
+            samples += 1
+            # не копим отставание, если сэмпл занял дольше интервала
+            next_tick = max(next_tick + interval, time.perf_counter())
+            time.sleep(max(0.0, min(next_tick, deadline) - time.perf_counter()))
+        return {
+            "samples": samples,
+            "seconds": round(time.perf_counter() - started, 3),
+            "interval_ms": interval * 1000,
+            "stacks": stacks,
+        }
+
+def collapsed(result: dict) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in result["stacks"].most_common())
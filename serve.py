@@ -0,0 +1,218 @@
+# python serve.py [--workers N] [--host 0.0.0.0] [--port 8000] [--app module:app]
+# Боевой запуск: pre-fork мастер. Приложение импортируется в мастере до fork,
+# так что код и загруженные модули у воркеров общие (copy-on-write); БД и Redis
+# каждый воркер подключает сам в lifespan. Все воркеры принимают соединения
+# с одного слушающего сокета. SIGTERM/SIGINT мастеру — мягкая остановка:
+# воркеры перестают принимать, дожидаются текущих запросов с фоновыми задачами,
+# дописывают write-behind и закрывают соединения; кто не успел — SIGKILL.
+# Сессии и загрузки лежат в общей БД, а /admin/sql-diagnostics и
+# /admin/profile видят только свой воркер: с SQL_DIAG=1 нужен --workers 1
+import os
+import gc
+import sys
+import math
+import time
+import ctypes
+import signal
+import socket
+import logging
+import argparse
+import importlib
+import importlib.util
+from typing import Dict
+
+import uvicorn
+
+log = logging.getLogger("serve")
+
+SERVE_APP = os.getenv("SERVE_APP", "end_homework_for_2ppa:app")
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+# 0 — по числу доступных процессу ядер (с учётом cpuset и квоты cgroup)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+# дольше idle-таймаута балансировщика (60 с у большинства), иначе он
+# отправляет запрос в соединение, которое воркер как раз закрывает
+SERVE_KEEP_ALIVE = int(os.getenv("SERVE_KEEP_ALIVE", "75"))
+# очередь принятых ядром соединений; упирается в net.core.somaxconn
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", "2048"))
+SERVE_GRACEFUL_TIMEOUT = int(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))
+# воркер, упавший быстрее этого после старта, считается не стартовавшим
+SERVE_MIN_UPTIME = float(os.getenv("SERVE_MIN_UPTIME", "5"))
+SERVE_MAX_FAST_FAILS = int(os.getenv("SERVE_MAX_FAST_FAILS", "5"))
+SERVE_ACCESS_LOG = os.getenv("SERVE_ACCESS_LOG", "0") == "1"
+
+def cpu_count() -> int:
+    n = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            n = min(n, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return n
+
+def loop_impl() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+def http_impl() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def load_app(spec: str):
+    module_name, _, attr = spec.partition(":")
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attr or "app")
+
+def _die_with_parent():
+    # Linux: воркер получит SIGTERM, если мастер умрёт без мягкой остановки
+    try:
+        ctypes.CDLL(None, use_errno=True).prctl(1, signal.SIGTERM)  # PR_SET_PDEATHSIG
+    except (OSError, AttributeError):
+        pass
+
+def run_worker(app, sock: socket.socket, args) -> None:
+    # своя группа процессов: Ctrl-C в терминале получает только мастер,
+    # и воркеры останавливаются один раз, по его SIGTERM
+    os.setpgid(0, 0)
+    _die_with_parent()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    config = uvicorn.Config(
+        app,
+        loop=loop_impl(),
+        http=http_impl(),
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=SERVE_ACCESS_LOG,
+        log_level="info",
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+class Master:
+    def __init__(self, app, sock: socket.socket, args):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers: Dict[int, float] = {}  # pid -> время старта
+        self.stopping = False
+        self.fast_fails = 0
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.args)
+            except BaseException:
+                logging.exception("worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+
+    def on_signal(self, signum, frame):
+        self.stopping = True
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            log.warning("worker %d exited with %d, restarting", pid, code)
+            self.fast_fails = self.fast_fails + 1 if time.monotonic() - started < SERVE_MIN_UPTIME else 0
+            if self.fast_fails >= SERVE_MAX_FAST_FAILS:
+                log.error("workers keep failing on start, giving up")
+                self.stopping = True
+                return
+            self.spawn()
+
+    def stop(self):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # запас поверх таймаута uvicorn — на lifespan shutdown
+        deadline = time.monotonic() + self.args.graceful_timeout + 10
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            log.error("worker %d did not stop in time, killing", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.workers.pop(pid, None)
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.on_signal)
+        signal.signal(signal.SIGINT, self.on_signal)
+        for _ in range(self.args.workers):
+            self.spawn()
+        log.info("serving on %s:%d with %d workers (%s, %s)", self.args.host, self.args.port, self.args.workers, loop_impl(), http_impl())
+        while not self.stopping:
+            self.reap()
+            time.sleep(0.2)
+        log.info("shutting down %d workers", len(self.workers))
+        self.stop()
+        self.sock.close()
+        return 1 if self.fast_fails >= SERVE_MAX_FAST_FAILS else 0
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--app", default=SERVE_APP)
+    ap.add_argument("--host", default=SERVE_HOST)
+    ap.add_argument("--port", type=int, default=SERVE_PORT)
+    ap.add_argument("--workers", type=int, default=WEB_CONCURRENCY or cpu_count())
+    ap.add_argument("--backlog", type=int, default=SERVE_BACKLOG)
+    ap.add_argument("--keep-alive", type=int, default=SERVE_KEEP_ALIVE)
+    ap.add_argument("--graceful-timeout", type=int, default=SERVE_GRACEFUL_TIMEOUT)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+
+    # сборщик мусора не трогает объекты мастера до fork: иначе первый же
+    # проход gc в воркере пишет в их заголовки и копирует общие страницы
+    gc.disable()
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    module, app = load_app(args.app)
+    per_worker = getattr(module, "per_worker_features", None)
+    if args.workers > 1 and per_worker is not None and per_worker():
+        log.error("%s keep state per worker, run with --workers 1", ", ".join(per_worker()))
+        return 2
+    prefork = getattr(module, "prefork", None)
+    if prefork is not None:
+        prefork()
+    # uvicorn импортирует реализации цикла и протокола лениво — подгружаем до fork
+    for name in (loop_impl(), f"uvicorn.protocols.http.{'httptools_impl' if http_impl() == 'httptools' else 'h11_impl'}"):
+        importlib.import_module(name)
+    sock = bind_socket(args.host, args.port, args.backlog)
+    gc.freeze()
+    return Master(app, sock, args).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Диагностика SQL, включаемая на лету: счёт и время запросов на HTTP-запрос,
+# лог медленных запросов с параметрами и планом (EXPLAIN), поиск N+1 —
+# одинаковых по форме SELECT, повторённых в одном запросе много раз
+import re
+import time
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+log = logging.getLogger("sqldiag")
+
+# списки плейсхолдеров из IN (...) сворачиваются, чтобы размер списка не менял форму
+_IN_LIST_RE = re.compile(r"\(\s*(\?|%s|%\(\w+\)s|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_WS_RE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST_RE.sub("(...)", _WS_RE.sub(" ", statement).strip())
+
+def _explain_sql(dialect: str, statement: str) -> Optional[str]:
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    if dialect == "sqlite":
+        return "EXPLAIN QUERY PLAN " + statement
+    if dialect in ("postgresql", "mysql", "mariadb"):
+        return "EXPLAIN " + statement
+    return None
+
+def explain(engine, statement: str, parameters) -> Optional[List[str]]:
+    sql = _explain_sql(engine.dialect.name, statement)
+    if sql is None:
+        return None
+    try:
+        with engine.connect() as c:
+            # info живёт вместе с соединением пула — флаг обязательно снять
+            c.info["sqldiag_skip"] = True
+            try:
+                rows = c.exec_driver_sql(sql, parameters if parameters is not None else ()).fetchall()
+            finally:
+                c.info.pop("sqldiag_skip", None)
+        return [" | ".join(str(v) for v in r) for r in rows]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+class SqlDiagnostics:
+    def __init__(self, enabled: bool = False, slow_ms: float = 100.0, n_plus_one: int = 10, explain_slow: bool = True, keep: int = 200):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.n_plus_one = n_plus_one
+        self.explain_slow = explain_slow
+        self.findings: deque = deque(maxlen=keep)
+        self.ctx: ContextVar[Optional[dict]] = ContextVar("sqldiag_request", default=None)
+        self._instrumented = False
+        self._lock = threading.Lock()
+
+    def settings(self) -> dict:
+        return {"enabled": self.enabled, "slow_ms": self.slow_ms, "n_plus_one": self.n_plus_one, "explain_slow": self.explain_slow}
+
+    def configure(self, **changes) -> dict:
+        for k, v in changes.items():
+            if v is not None and k in ("enabled", "slow_ms", "n_plus_one", "explain_slow"):
+                setattr(self, k, v)
+        return self.settings()
+
+    def instrument(self):
+        if self._instrumented:
+            return
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+        self._instrumented = True
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault("sqldiag_t0", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("sqldiag_t0")
+        if not stack or conn.info.get("sqldiag_skip"):
+            if stack:
+                stack.pop()
+            return
+        dt = time.perf_counter() - stack.pop()
+        ctx = self.ctx.get()
+        slow = dt * 1000 >= self.slow_ms
+        if ctx is None:
+            # вне HTTP-запроса (фоновые задачи, потоки) — только медленные, сразу
+            if slow:
+                self._report_slow(conn.engine, statement, None if executemany else parameters, dt, None)
+            return
+        ctx["count"] += 1
+        ctx["time"] += dt
+        shape = statement_shape(statement)
+        ctx["shapes"][shape] = ctx["shapes"].get(shape, 0) + 1
+        if slow:
+            ctx["slow"].append((conn.engine, statement, None if executemany else parameters, dt))
+
+    def _record(self, finding: dict):
+        with self._lock:
+            self.findings.append(finding)
+
+    def _report_slow(self, engine, statement: str, parameters, dt: float, route: Optional[str]):
+        plan = explain(engine, statement, parameters) if self.explain_slow else None
+        self._record({"kind": "slow", "route": route, "ms": round(dt * 1000, 2), "statement": statement, "parameters": repr(parameters), "plan": plan, "ts": time.time()})
+        log.warning("slow query %.1f ms%s: %s params=%r plan=%s", dt * 1000, f" in {route}" if route else "", statement, parameters, plan)
+
+    def finish(self, ctx: dict, route: str):
+        for engine, statement, parameters, dt in ctx["slow"]:
+            self._report_slow(engine, statement, parameters, dt, route)
+        for shape, n in ctx["shapes"].items():
+            if n >= self.n_plus_one and shape.upper().startswith("SELECT"):
+                self._record({"kind": "n_plus_one", "route": route, "repeats": n, "statement": shape, "ts": time.time()})
+                log.warning("possible N+1 in %s: %d x %s", route, n, shape)
+
+    def report(self, limit: int = 100) -> List[dict]:
+        with self._lock:
+            return list(self.findings)[-limit:][::-1]
+
+class SqlDiagMiddleware:
+    def __init__(self, app, diag: SqlDiagnostics):
+        self.app = app
+        self.diag = diag
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.diag.enabled:
+            await self.app(scope, receive, send)
+            return
+        ctx = {"count": 0, "time": 0.0, "shapes": {}, "slow": []}
+        token = self.diag.ctx.set(ctx)
+
+        async def send_wrapper(message):
+            # к моменту заголовков обработчик уже отработал (кроме потоковых тел)
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-sql-count", str(ctx["count"]).encode()),
+                    (b"x-sql-time-ms", f"{ctx['time'] * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.diag.ctx.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            await run_in_threadpool(self.diag.finish, ctx, route)
@@ -0,0 +1,42 @@
+# Общие фикстуры: приложение на временной SQLite, Redis недоступен
+# (работает локальный кэш), фоновое переподключение выключено
+import os
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:1/0")
+os.environ.setdefault("REDIS_RETRY_INTERVAL", "0")
+os.environ.setdefault("DB_URL", "sqlite://")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import end_homework_for_2ppa as api
+
+@pytest.fixture
+def db_url(tmp_path) -> str:
+    return f"sqlite:///{tmp_path / 'students.db'}"
+
+@pytest.fixture
+def app_env(db_url, monkeypatch):
+    monkeypatch.setattr(api, "DB_URL", db_url)
+    api.SESSIONS.clear()
+    api.UPLOADS.clear()
+    api.rds.flushdb()
+    yield api
+    api.close_resources()
+
+@pytest.fixture
+def client(app_env):
+    with TestClient(app_env.app) as c:
+        yield c
+
+def login(c: TestClient, username: str = "u", password: str = "p") -> dict:
+    c.post("/auth/register", json={"username": username, "password": password})
+    token = c.post("/auth/login", json={"username": username, "password": password}).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def auth(client) -> dict:
+    return login(client)
+
+def student(**kw) -> dict:
+    return {"surname": "Иванов", "name": "Иван", "faculty": "ФПМИ", "course": "Физика", "grade": 80, **kw}
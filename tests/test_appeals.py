@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+
+import httpx
+
+import pytest
+from fastapi.testclient import TestClient
+
+import homework_2 as hw
+
+def appeal(**kw) -> dict:
+    return {"surname": "Иванов", "name": "Иван", "birthdate": "2000-01-01", "phone": "+79991234567", "email": "a@example.com", **kw}
+
+@pytest.fixture
+def appeals(tmp_path, monkeypatch):
+    monkeypatch.setattr(hw, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(hw, "INDEX_PATH", str(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(hw, "BLOOM_PATH", str(tmp_path / "bloom.bin"))
+    with TestClient(hw.app) as c:
+        yield c
+
+def ndjson(rows) -> bytes:
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in rows).encode("utf-8")
+
+def test_bulk_write_failure_returns_partial_ids(appeals, monkeypatch):
+    calls = []
+
+    def flaky_uuid4():
+        calls.append(1)
+        if len(calls) > 2:
+            raise OSError("disk full")
+        return uuid.uuid4()
+
+    monkeypatch.setattr(hw, "uuid4", flaky_uuid4)
+    rows = [appeal(phone=f"+7999123456{i}") for i in range(4)]
+    r = appeals.post("/appeals/bulk", content=ndjson(rows))
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "partial" and body["accepted"] == 2 and body["failed"] == 2
+    assert [e["line"] for e in body["errors"]] == [3, 4]
+    for file_id in body["ids"]:
+        assert appeals.get(f"/appeals/{file_id}").status_code == 200
+
+def test_idempotency_key_reuse_with_other_body_is_rejected(appeals):
+    h = {"Idempotency-Key": "k1"}
+    first = appeals.post("/appeals", headers=h, json=appeal())
+    assert first.json()["status"] == "ok"
+    again = appeals.post("/appeals", headers=h, json=appeal())
+    assert again.json()["status"] == "duplicate" and again.json()["id"] == first.json()["id"]
+    other = appeals.post("/appeals", headers=h, json=appeal(name="Пётр"))
+    assert other.status_code == 409
+    assert appeals.get("/appeals").json()["count"] == 1
+    assert hw._claims == {}
+
+def test_legacy_idempotency_keys_get_content_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(hw, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(hw, "INDEX_PATH", str(tmp_path / "index.sqlite3"))
+    db = hw.open_index()
+    db.execute("DROP TABLE idempotency_keys")
+    db.execute("CREATE TABLE idempotency_keys (key TEXT PRIMARY KEY, appeal_id TEXT NOT NULL)")
+    db.execute(hw.INSERT_INDEX_SQL, hw.index_row("a1", appeal(), os.stat(tmp_path)))
+    db.execute("INSERT INTO idempotency_keys VALUES ('k1', 'a1')")
+    db.commit()
+    db.close()
+    db = hw.open_index()
+    row = db.execute("SELECT content_hash FROM idempotency_keys WHERE key = 'k1'").fetchone()
+    db.close()
+    assert row[0] == hw.content_hash(appeal())
+
+def test_index_follows_edits_and_deletions(tmp_path, monkeypatch):
+    monkeypatch.setattr(hw, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(hw, "INDEX_PATH", str(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(hw, "BLOOM_PATH", str(tmp_path / "bloom.bin"))
+    with TestClient(hw.app) as c:
+        edited = c.post("/appeals", json=appeal()).json()["id"]
+        deleted = c.post("/appeals", json=appeal(phone="+79990000000")).json()["id"]
+    # правка и удаление в data/ в обход API, пока сервис остановлен
+    path = tmp_path / f"{edited}.json"
+    path.write_text(json.dumps(appeal(surname="Петров"), ensure_ascii=False), encoding="utf-8")
+    os.remove(tmp_path / f"{deleted}.json")
+    with TestClient(hw.app) as c:
+        assert c.get(f"/appeals/{edited}").json()["data"]["surname"] == "Петров"
+        assert c.get(f"/appeals/{deleted}").status_code == 404
+        assert "c:" + hw.content_hash(appeal(phone="+79990000000")) not in hw.bloom
+        # старое содержимое больше не считается дублем
+        assert c.post("/appeals", json=appeal()).json()["status"] == "ok"
+
+def test_concurrent_posts_with_one_key_write_one_appeal(appeals, monkeypatch):
+    save_appeals = hw.save_appeals
+
+    def slow_save_appeals(payloads, ids=None):
+        time.sleep(0.05)
+        return save_appeals(payloads, ids)
+
+    monkeypatch.setattr(hw, "save_appeals", slow_save_appeals)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=hw.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await asyncio.gather(*(
+                c.post("/appeals", headers={"Idempotency-Key": "same"}, json=appeal()) for _ in range(5)
+            ))
+
+    results = [r.json() for r in asyncio.run(burst())]
+    assert sorted(r["status"] for r in results) == ["duplicate"] * 4 + ["ok"]
+    assert len({r["id"] for r in results}) == 1
+    assert appeals.get("/appeals").json()["count"] == 1
+    assert hw._claims == {}
@@ -0,0 +1,27 @@
+import os
+import sys
+import json
+import subprocess
+
+from bench.common import percentiles, write_csv
+
+import end_homework_for_2ppa as api
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_percentiles_and_generated_csv(tmp_path):
+    assert percentiles([]) == {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    assert percentiles([i / 1000 for i in range(1, 101)]) == {"p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0}
+    path = tmp_path / "s.csv"
+    write_csv(str(path), 250, chunk=100)
+    assert len(list(api.read_csv_students(str(path)))) == 250
+
+def test_dao_micro_writes_a_report(tmp_path):
+    out = tmp_path / "report.json"
+    subprocess.run(
+        [sys.executable, "-m", "bench.dao_micro", "--rows", "200", "--calls", "2", "--heavy-calls", "1", "--out", str(out)],
+        cwd=ROOT, check=True, capture_output=True, timeout=120,
+    )
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["bench"] and report["results"]
+    assert all(r["calls"] > 0 and r["p50_ms"] is not None for r in report["results"].values())
@@ -0,0 +1,72 @@
+from tests.conftest import student
+
+def test_batch_reads_cache_in_one_round_trip(client, auth, app_env, monkeypatch):
+    api = app_env
+    ids = [client.post("/students", headers=auth, json=student(surname=s)).json()["id"] for s in ("A", "B", "C")]
+    calls = {"mget": 0, "get_by_ids": 0}
+    mget, get_by_ids = api.rds.mget, api.dao.get_by_ids
+
+    def counting_mget(keys):
+        calls["mget"] += 1
+        return mget(keys)
+
+    def counting_get_by_ids(ids):
+        calls["get_by_ids"] += 1
+        return get_by_ids(ids)
+
+    monkeypatch.setattr(api.rds, "mget", counting_mget)
+    monkeypatch.setattr(api.dao, "get_by_ids", counting_get_by_ids)
+    first = client.get("/students/batch", headers=auth, params=[("ids", i) for i in ids])
+    second = client.get("/students/batch", headers=auth, params=[("ids", i) for i in reversed(ids)])
+    assert [s["surname"] for s in first.json()] == ["A", "B", "C"]
+    assert [s["surname"] for s in second.json()] == ["C", "B", "A"]
+    # промах — одна выборка из БД, повтор целиком из кэша; каждый раз один MGET
+    assert calls == {"mget": 2, "get_by_ids": 1}
+
+def test_local_cache_honours_ttl_and_byte_budget(app_env, monkeypatch):
+    api = app_env
+    now = [1000.0]
+    monkeypatch.setattr(api.time, "monotonic", lambda: now[0])
+    c = api._InMemoryCache(max_bytes=10**6)
+    c.set("short", "v", ex=1)
+    c.set("forever", "v")
+    now[0] += 2
+    assert c.get("short") is None and c.get("forever") == "v"
+    assert c.stats()["expirations"] == 1
+
+    item = api.sys.getsizeof("k0") + api.sys.getsizeof("x" * 100)
+    c = api._InMemoryCache(max_bytes=3 * item)
+    for i in range(3):
+        c.set(f"k{i}", "x" * 100)
+    c.get("k0")  # k0 свежий, вытесняется k1
+    c.set("k3", "x" * 100)
+    assert c.mget(["k0", "k1", "k2", "k3"]) == ["x" * 100, None, "x" * 100, "x" * 100]
+    assert c.bytes <= c.max_bytes and c.stats()["evictions"] == 1
+    c.set("huge", "x" * 10**4)
+    assert c.get("huge") is None and c.get("k3") is not None
+
+def test_l1_serves_hits_and_follows_invalidation_messages(app_env, monkeypatch):
+    api = app_env
+    api.init_resources()
+    monkeypatch.setattr(api, "l1", api._InMemoryCache())
+    api.cache_set("k", {"a": 1})
+    api.rds.flushdb()
+    # L2 пуст, ответ из L1 без обращения к Redis
+    assert api.cache_get("k") == {"a": 1}
+    # сообщение другого воркера: L1 сбрасывается, версия данных подхватывается
+    v = api.dao.version
+    api._l1_invalidate({"data": str(v + 5)})
+    assert api.cache_get("k") is None
+    assert api.dao.version == v + 5
+
+def test_canonical_keys_and_route_policies():
+    from cache_policy import canonical_key, policy_for, encode_value, decode_value, DEFAULT_POLICY
+    # порядок параметров и форма Unicode не плодят разные ключи
+    assert canonical_key("/students", "b=2&a=1") == canonical_key("/students", "a=1&b=2")
+    assert canonical_key("/faculties/\u0419/avg") == canonical_key("/faculties/\u0418\u0306/avg")
+    assert policy_for("/courses").ttl == 3600 and policy_for("/nope") == DEFAULT_POLICY
+    policy = policy_for("/students")
+    big = b"[" + b"1," * 20000 + b"1]"
+    stored = encode_value(big, policy)
+    assert len(stored) < len(big) and decode_value(stored) == big
+    assert encode_value(b"x" * 5000, policy_for("/students/{student_id}")) is None
@@ -0,0 +1,22 @@
+import asyncio
+
+from tests.conftest import student
+
+def test_changes_feed_reads_journal_off_the_loop(client, auth, app_env, monkeypatch):
+    api = app_env
+    get_changes = api.dao.get_changes
+
+    def off_loop_get_changes(since, limit=1000):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return get_changes(since, limit)
+        raise AssertionError("get_changes called on the event loop")
+
+    monkeypatch.setattr(api.dao, "get_changes", off_loop_get_changes)
+    ids = [client.post("/students", headers=auth, json=student(surname=s)).json()["id"] for s in ("A", "B")]
+    first = client.get("/changes", headers=auth, params={"limit": 1}).json()
+    assert len(first["changes"]) == 1
+    rest = client.get("/changes", headers=auth, params={"since": first["next"]}).json()
+    assert [c["op"] for c in first["changes"] + rest["changes"]] == ["insert", "insert"]
+    assert [c["id"] for c in first["changes"] + rest["changes"]] == ids
@@ -0,0 +1,54 @@
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from tests.conftest import login, student
+
+CSV = "Фамилия,Имя,Факультет,Курс,Оценка\r\nИванов,Иван,ФПМИ,Физика,80\r\nПетров,Пётр,АВТФ,Физика,70\r\n"
+
+def test_upsert_import_is_incremental(client, auth, tmp_path):
+    path = tmp_path / "s.csv"
+    path.write_text(CSV, encoding="utf-8-sig")
+    r = client.post("/tasks/load_csv", headers=auth, params={"path": str(path), "mode": "upsert"})
+    assert r.json()["status"] == "scheduled"
+    path.write_text(CSV.replace(",80", ",95"), encoding="utf-8-sig")
+    client.post("/tasks/load_csv", headers=auth, params={"path": str(path), "mode": "upsert"})
+    rows = client.get("/students", headers=auth).json()
+    assert sorted((s["surname"], s["grade"]) for s in rows) == [("Иванов", 95), ("Петров", 70)]
+
+def test_sharded_upsert_key_without_faculty_is_rejected(app_env, tmp_path, monkeypatch):
+    api = app_env
+    shards = {"ФПМИ": f"sqlite:///{tmp_path / 'a.db'}", "*": f"sqlite:///{tmp_path / 'b.db'}"}
+    monkeypatch.setattr(api, "DB_SHARD_MAP", json.dumps(shards))
+    with TestClient(api.app) as c:
+        h = login(c)
+        r = c.post("/tasks/load_csv", headers=h, params={"path": "x.csv", "mode": "upsert", "key": "surname,name"})
+        assert r.status_code == 400
+        r = c.post("/tasks/load_csv", headers=h, params={"path": "x.csv", "mode": "upsert", "key": "surname,name,faculty"})
+        assert r.status_code == 200
+
+def test_background_failure_is_logged(client, auth, caplog):
+    with caplog.at_level(logging.ERROR, logger="students_api"):
+        client.post("/tasks/load_csv", headers=auth, params={"path": "/nonexistent.csv"})
+    assert any("load_csv /nonexistent.csv" in r.getMessage() for r in caplog.records)
+
+def test_rows_added_between_imports_are_not_duplicated(client, auth, tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text(CSV, encoding="utf-8-sig")
+    client.post("/tasks/load_csv", headers=auth, params={"path": str(path), "mode": "upsert"})
+    # после первого импорта: строка через API и строка через append-загрузку
+    client.post("/students", headers=auth, json=student(surname="Сидоров", name="Олег"))
+    extra = tmp_path / "b.csv"
+    extra.write_text("Фамилия,Имя,Факультет,Курс,Оценка\r\nКузнецов,Иван,ФЛА,Химия,60\r\n", encoding="utf-8-sig")
+    client.post("/tasks/load_csv", headers=auth, params={"path": str(extra)})
+    path.write_text(CSV + "Сидоров,Олег,ФПМИ,Физика,99\r\nКузнецов,Иван,ФЛА,Химия,60\r\n", encoding="utf-8-sig")
+    client.post("/tasks/load_csv", headers=auth, params={"path": str(path), "mode": "upsert"})
+    rows = client.get("/students", headers=auth).json()
+    assert sorted((s["surname"], s["grade"]) for s in rows) == [("Иванов", 80), ("Кузнецов", 60), ("Петров", 70), ("Сидоров", 99)]
+
+def test_upsert_is_rejected_up_front_without_dialect_support(client, auth, app_env, monkeypatch):
+    monkeypatch.setattr(app_env, "UPSERT_DIALECTS", ())
+    r = client.post("/tasks/load_csv", headers=auth, params={"path": "x.csv", "mode": "upsert"})
+    assert r.status_code == 400
+    assert client.post("/tasks/load_csv", headers=auth, params={"path": "/nonexistent.csv"}).status_code == 200
@@ -0,0 +1,23 @@
+import pytest
+
+import end_homework_for_2ppa as api
+
+SAMPLE = (
+    "Курс,Фамилия,Имя,Факультет,Оценка\r\n"
+    "Физика,Иванов,Иван,ФПМИ,80\r\n"
+    '"Физика, углублённая",Петров,"Пётр\nПетрович",АВТФ,70\r\n'
+    'Химия,"Сидоров ""младший""",Олег,ФПМИ,90\n'
+    "Химия,Плохой,Ряд,ФПМИ,не число\n"
+    "Химия,Короткий\n"
+    "\n"
+    "Физика,Последний,Без,ФЛА,55"
+)
+
+@pytest.mark.parametrize("encoding", ["utf-8-sig", "cp1251"])
+def test_mmap_reader_matches_dictreader(tmp_path, encoding):
+    path = tmp_path / "s.csv"
+    path.write_bytes(SAMPLE.encode(encoding))
+    fast = list(api.read_csv_students(str(path), encoding))
+    assert fast == list(api.read_csv_rows(str(path), encoding))
+    assert [r["surname"] for r in fast] == ["Иванов", "Петров", 'Сидоров "младший"', "Последний"]
+    assert fast[1]["name"] == "Пётр\nПетрович"
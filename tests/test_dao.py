@@ -0,0 +1,106 @@
+import end_homework_for_2ppa as api
+
+def pragma(engine, name):
+    with engine.connect() as c:
+        return c.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+def test_sqlite_connections_are_tuned(db_url):
+    engine = api.make_engine(db_url)
+    try:
+        assert pragma(engine, "journal_mode") == "wal"
+        assert pragma(engine, "synchronous") == 1  # NORMAL
+        assert pragma(engine, "busy_timeout") == api.SQLITE_BUSY_TIMEOUT_MS
+        assert pragma(engine, "temp_store") == 2  # MEMORY
+    finally:
+        engine.dispose()
+    memory = api.make_engine("sqlite://")
+    assert pragma(memory, "journal_mode") == "memory"
+    assert pragma(memory, "busy_timeout") == api.SQLITE_BUSY_TIMEOUT_MS
+    memory.dispose()
+
+def test_replica_reads_stick_to_primary_after_own_write(tmp_path, monkeypatch):
+    primary, replica = f"sqlite:///{tmp_path / 'p.db'}", f"sqlite:///{tmp_path / 'r.db'}"
+    api.StudentsDAO(replica).close()  # «реплика» со схемой, но без данных — отстаёт
+    dao = api.StudentsDAO(primary, replica_urls=[replica])
+    monkeypatch.setattr(api, "DB_REPLICA_MAX_LAG", 0)
+    try:
+        token = api.current_client.set("writer")
+        sid = dao.insert("Иванов", "Иван", "ФПМИ", "Физика", 80)
+        assert dao.get_by_id(sid) is not None
+        api.current_client.reset(token)
+        token = api.current_client.set("reader")
+        assert dao.get_by_id(sid) is None
+        api.current_client.reset(token)
+        # окно прилипания закончилось — писавший тоже читает с реплики
+        monkeypatch.setattr(api, "DB_READ_STICKY_SECONDS", 0)
+        token = api.current_client.set("writer")
+        assert dao.get_by_id(sid) is None
+        api.current_client.reset(token)
+        # сразу после смены версии данных все чтения идут на primary
+        monkeypatch.setattr(api, "DB_REPLICA_MAX_LAG", 60)
+        assert dao.get_by_id(sid) is not None
+    finally:
+        dao.close()
+
+def sharded(tmp_path) -> "api.ShardedStudentsDAO":
+    return api.ShardedStudentsDAO(
+        f"sqlite:///{tmp_path / 'meta.db'}",
+        {"ФПМИ": f"sqlite:///{tmp_path / 'a.db'}", "*": f"sqlite:///{tmp_path / 'b.db'}"},
+    )
+
+def test_sharding_routes_by_faculty_with_unique_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "ID_BLOCK_SIZE", 2)
+    one, two = sharded(tmp_path), sharded(tmp_path)
+    try:
+        ids = one.insert_many([
+            {"surname": "А", "name": "А", "faculty": "ФПМИ", "course": "Физика", "grade": 90},
+            {"surname": "Б", "name": "Б", "faculty": "АВТФ", "course": "Физика", "grade": 70},
+        ])
+        # второй процесс берёт свой блок id из общей meta-БД
+        ids += [two.insert("В", "В", "ФПМИ", "Физика", 50), one.insert("Г", "Г", "АВТФ", "Физика", 60)]
+        assert len(set(ids)) == 4
+        fpmi = one.shard_for("ФПМИ")
+        assert [r.surname for r in fpmi.select_all()] == ["А", "В"]
+        assert [r.surname for r in one.default_shard.select_all()] == ["Б", "Г"]
+        assert [r.id for r in one.select_all()] == sorted(ids)
+        assert one.get_avg_grade_by_faculty("ФПМИ") == 70
+        # смена факультета переносит строку в другой шард с тем же id
+        assert one.update(ids[1], {"faculty": "ФПМИ"})
+        assert one.get_by_id(ids[1]).faculty == "ФПМИ"
+        assert ids[1] in {r.id for r in fpmi.select_all()}
+        assert one.get_changes(0)[-1]["op"] == "update"
+    finally:
+        one.close()
+        two.close()
+
+def test_read_statements_hit_the_compiled_cache(db_url):
+    from sqlalchemy import event
+    dao = api.StudentsDAO(db_url)
+    hits = []
+
+    @event.listens_for(dao.engine, "after_cursor_execute")
+    def _track(conn, cursor, statement, params, context, executemany):
+        hits.append(context.cache_hit == context.dialect.CACHE_HIT)
+
+    try:
+        sid = dao.insert("Иванов", "Иван", "ФПМИ", "Физика", 80)
+        hits.clear()
+        for _ in range(2):
+            dao.get_by_id(sid)
+            dao.get_by_ids([sid, sid + 1])
+            dao.get_avg_grade_by_faculty("ФПМИ")
+        assert hits[3:] == [True, True, True]
+    finally:
+        dao.close()
+
+def test_read_paths_return_plain_rows(db_url):
+    dao = api.StudentsDAO(db_url)
+    try:
+        sid = dao.insert("Иванов", "Иван", "ФПМИ", "Физика", 80)
+        row = dao.get_by_id(sid)
+        assert type(row) is api.StudentRow
+        assert row == (sid, "Иванов", "Иван", "ФПМИ", "Физика", 80)
+        assert row._asdict() == api.StudentOut(**row._asdict()).model_dump()
+        assert all(type(r) is api.StudentRow for r in dao.select_all() + dao.get_by_ids([sid]))
+    finally:
+        dao.close()
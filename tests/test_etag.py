@@ -0,0 +1,43 @@
+from tests.conftest import student
+
+def test_conditional_get_round_trip(client, auth):
+    client.post("/students", headers=auth, json=student())
+    first = client.get("/students", headers=auth)
+    etag = first.headers["etag"]
+    again = client.get("/students", headers={**auth, "If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    client.post("/students", headers=auth, json=student(surname="Петров"))
+    changed = client.get("/students", headers={**auth, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert len(changed.json()) == 2
+
+def test_wildcard_does_not_hide_missing_row(client, auth):
+    r = client.get("/students/999", headers={**auth, "If-None-Match": "*"})
+    assert r.status_code == 404
+
+def test_write_from_another_process_is_seen_without_redis(client, auth, app_env, db_url, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "LOCAL_VERSION_TTL", 3600)
+    client.post("/students", headers=auth, json=student())
+    etag = client.get("/students", headers=auth).headers["etag"]
+    # другой процесс пишет в ту же БД; pub/sub нет, сообщить некому
+    other = api.StudentsDAO(db_url)
+    other.insert("Петров", "Пётр", "ФПМИ", "Физика", 70)
+    other.close()
+    # в пределах LOCAL_VERSION_TTL версия не перечитывается — ответ ещё старый
+    assert client.get("/students", headers={**auth, "If-None-Match": etag}).status_code == 304
+    api.dao._version_read_at -= api.LOCAL_VERSION_TTL
+    r = client.get("/students", headers={**auth, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert {s["surname"] for s in r.json()} == {"Иванов", "Петров"}
+
+def test_version_is_refreshed_at_least_every_l1_ttl(app_env, db_url):
+    api = app_env
+    api.init_resources()
+    other = api.StudentsDAO(db_url)
+    other.insert("Петров", "Пётр", "ФПМИ", "Физика", 70)
+    other.close()
+    v = api.dao.version
+    assert api.dao.refresh_version(3600) == v
+    api.dao._version_read_at -= 3600
+    assert api.dao.refresh_version(3600) == v + 1
@@ -0,0 +1,30 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from tests.conftest import student
+
+def seed(client, auth):
+    for s, f, g in (("А", "ФПМИ", 90), ("Б", "АВТФ", 70), ("В", "ФПМИ", 50)):
+        client.post("/students", headers=auth, json=student(surname=s, faculty=f, grade=g))
+
+def test_export_csv_gzip_and_filters(client, auth):
+    seed(client, auth)
+    r = client.get("/export/students", headers=auth, params={"compress": "gzip", "chunk": 100})
+    assert r.status_code == 200 and "students.csv.gz" in r.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(gzip.decompress(r.content).decode("utf-8"))))
+    assert rows[0] == ["id", "surname", "name", "faculty", "course", "grade"]
+    assert [row[1] for row in rows[1:]] == ["А", "Б", "В"]
+    r = client.get("/export/students", headers=auth, params={"format": "ndjson", "faculty": "ФПМИ", "min_grade": 60})
+    assert [json.loads(line)["surname"] for line in r.text.splitlines()] == ["А"]
+
+def test_export_parquet_round_trip(client, auth):
+    pq = pytest.importorskip("pyarrow.parquet")
+    seed(client, auth)
+    r = client.get("/export/students", headers=auth, params={"format": "parquet", "chunk": 100})
+    table = pq.read_table(io.BytesIO(r.content))
+    assert table.column_names == ["id", "surname", "name", "faculty", "course", "grade"]
+    assert table.column("grade").to_pylist() == [90, 70, 50]
@@ -0,0 +1,25 @@
+import re
+
+from tests.conftest import student
+
+def sample(text: str, name: str, **labels) -> float:
+    want = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    m = re.search(rf"^{re.escape(name)}\{{{re.escape(want)}\}} (\S+)$", text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+def test_metrics_count_requests_stages_and_cache(client, auth):
+    client.post("/students", headers=auth, json=student())
+    before = client.get("/metrics").text
+    client.get("/students", headers=auth)
+    client.get("/students", headers=auth)
+    client.get("/students/999", headers=auth)
+    after = client.get("/metrics")
+    assert after.headers["content-type"].startswith("text/plain; version=0.0.4")
+    after = after.text
+    delta = lambda name, **kw: sample(after, name, **kw) - sample(before, name, **kw)
+    assert delta("http_requests_total", method="GET", route="/students", status="200") == 2
+    assert delta("http_requests_total", method="GET", route="/students/{student_id}", status="404") == 1
+    assert delta("http_request_duration_seconds_count", method="GET", route="/students") == 2
+    assert delta("http_stage_duration_seconds_count", route="/students", stage="auth") == 2
+    assert delta("cache_lookups_total", result="hit") >= 1
+    assert delta("db_queries_per_request_count", route="/students") == 2
@@ -0,0 +1,28 @@
+import threading
+
+import profiler
+
+def test_profile_endpoint_is_admin_only_and_exclusive(client, auth, app_env, monkeypatch):
+    api = app_env
+    assert client.get("/admin/profile", headers=auth, params={"seconds": 0.05}).status_code == 403
+    monkeypatch.setattr(api, "ADMIN_USER_IDS", {api.users.verify_user("u", "p")})
+    r = client.get("/admin/profile", headers=auth, params={"seconds": 0.05, "interval_ms": 5})
+    assert r.status_code == 200 and int(r.headers["x-profile-samples"]) > 0
+    # каждая строка — свёрнутый стек и число сэмплов
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in r.text.splitlines())
+    assert client.get("/admin/profile", headers=auth, params={"seconds": 10**6}).status_code == 422
+    with api.sampler._lock:
+        assert client.get("/admin/profile", headers=auth, params={"seconds": 0.05}).status_code == 409
+
+def test_sampler_sees_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="sleeper")
+    worker.start()
+    try:
+        result = profiler.SamplingProfiler().run(0.05, 0.005, thread_filter="sleeper")
+    finally:
+        stop.set()
+        worker.join()
+    assert result["samples"] > 0
+    assert result["stacks"] and all(s.startswith("sleeper;") for s in result["stacks"])
+    assert any("wait (threading.py" in s for s in result["stacks"])
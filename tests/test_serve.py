@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+
+import httpx
+
+import serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_cpu_count_and_shared_socket():
+    assert 1 <= serve.cpu_count() <= (os.cpu_count() or 1)
+    sock = serve.bind_socket("127.0.0.1", 0, 16)
+    try:
+        assert sock.get_inheritable() and sock.getsockname()[1] > 0
+    finally:
+        sock.close()
+
+def test_prefork_server_serves_and_drains_on_sigterm(tmp_path):
+    sock = serve.bind_socket("127.0.0.1", 0, 16)
+    port = sock.getsockname()[1]
+    sock.close()
+    env = {**os.environ, "DB_URL": f"sqlite:///{tmp_path / 'serve.db'}", "REDIS_URL": "redis://localhost:1/0", "METRICS_ENABLED": "1"}
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", "2", "--host", "127.0.0.1", "--port", str(port), "--graceful-timeout", "5"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                assert httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code < 500
+                break
+            except httpx.HTTPError:
+                assert proc.poll() is None and time.monotonic() < deadline
+                time.sleep(0.1)
+        assert all(httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=5).status_code == 200 for _ in range(10))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        code = proc.wait(30)
+    assert code == 0
+
+def test_per_worker_features_need_one_worker(tmp_path):
+    env = {**os.environ, "DB_URL": f"sqlite:///{tmp_path / 'serve.db'}", "REDIS_URL": "redis://localhost:1/0", "SQL_DIAG": "1"}
+    proc = subprocess.run(
+        [sys.executable, "serve.py", "--workers", "2", "--host", "127.0.0.1", "--port", "0"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 2 and "SQL_DIAG" in proc.stderr
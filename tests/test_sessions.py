@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from tests.conftest import login
+
+def test_token_from_another_worker_is_accepted(client, app_env, db_url):
+    api = app_env
+    login(client)
+    uid = api.users.verify_user("u", "p")
+    # сессию заводит другой воркер: свой процесс, свой движок, общая БД
+    other = api.StudentsDAO(db_url)
+    token = api.UsersDAO(other.engine).create_session(uid)
+    other.close()
+    assert token not in api.SESSIONS
+    r = client.get("/courses", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+
+def test_logout_elsewhere_revokes_after_cache_ttl(client, app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "SESSION_CACHE_TTL", 0)
+    h = login(client)
+    assert client.get("/courses", headers=h).status_code == 200
+    token = h["Authorization"].split(" ", 1)[1]
+    api.users.drop_session(token)
+    assert client.get("/courses", headers=h).status_code == 401
+
+def test_unknown_token_is_rejected(client):
+    assert client.get("/courses", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+def test_sessions_expire_and_are_purged(client, app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "SESSION_CACHE_TTL", 0)
+    h = login(client)
+    with api.Session(api.users.engine) as s:
+        s.execute(update(api.AuthSession).values(created_at=api.time.time() - api.SESSION_TTL - 1))
+        s.commit()
+    assert client.get("/courses", headers=h).status_code == 401
+    # следующий логин чистит истёкшие сессии
+    api.users._purged_at = 0.0
+    fresh = login(client)
+    with api.Session(api.users.engine) as s:
+        assert s.query(api.AuthSession).count() == 1
+    assert client.get("/courses", headers=fresh).status_code == 200
+
+def test_local_session_cache_is_bounded(app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "SESSION_CACHE_MAX", 3)
+    api.remember_session("expired", 1, -100.0)
+    for i in range(5):
+        api.remember_session(f"t{i}", 1, 0.0)
+    assert len(api.SESSIONS) <= 3
+    assert "expired" not in api.SESSIONS and "t4" in api.SESSIONS
+
+def test_in_memory_database_is_shared_with_the_threadpool(app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "DB_URL", "sqlite://")
+    with TestClient(api.app) as c:
+        h = login(c)
+        assert c.get("/courses", headers=h).status_code == 200
@@ -0,0 +1,45 @@
+import sqldiag
+import end_homework_for_2ppa as api
+
+from tests.conftest import student
+
+def test_slow_queries_are_logged_with_a_plan(client, auth, monkeypatch):
+    for k in ("enabled", "slow_ms", "n_plus_one", "explain_slow"):
+        monkeypatch.setattr(api.sql_diag, k, getattr(api.sql_diag, k))
+    monkeypatch.setattr(api.sql_diag, "findings", type(api.sql_diag.findings)(maxlen=200))
+    monkeypatch.setattr(api, "ADMIN_USER_IDS", {api.users.verify_user("u", "p")})
+    assert client.get("/admin/sql-diagnostics", headers=auth).json()["settings"]["enabled"] is False
+    r = client.put("/admin/sql-diagnostics", headers=auth, json={"enabled": True, "slow_ms": 0})
+    assert r.json()["settings"]["enabled"] is True
+    client.post("/students", headers=auth, json=student())
+    r = client.get("/students", headers=auth)
+    assert int(r.headers["x-sql-count"]) >= 1
+    findings = client.get("/admin/sql-diagnostics", headers=auth).json()["findings"]
+    slow = [f for f in findings if f["kind"] == "slow" and f["route"] == "/students" and "FROM students" in f["statement"]]
+    assert slow and slow[0]["plan"]
+
+def test_n_plus_one_is_detected_by_statement_shape(db_url, monkeypatch):
+    diag = api.sql_diag
+    for k, v in (("enabled", True), ("slow_ms", 10**6), ("n_plus_one", 3)):
+        monkeypatch.setattr(diag, k, v)
+    monkeypatch.setattr(diag, "findings", type(diag.findings)(maxlen=200))
+    dao = api.StudentsDAO(db_url)
+    ctx = {"count": 0, "time": 0.0, "shapes": {}, "slow": []}
+    token = diag.ctx.set(ctx)
+    try:
+        for i in range(1, 4):
+            dao.get_by_id(i)
+        dao.get_by_ids([1, 2])
+        dao.get_by_ids([1, 2, 3])
+    finally:
+        diag.ctx.reset(token)
+        dao.close()
+    diag.finish(ctx, "/x")
+    assert [f["repeats"] for f in diag.report() if f["kind"] == "n_plus_one"] == [3]
+    assert sqldiag.statement_shape("SELECT * FROM t WHERE id IN (?, ?,\n ?)") == "SELECT * FROM t WHERE id IN (...)"
+
+def test_sql_diagnostics_cannot_be_enabled_with_many_workers(client, auth, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_USER_IDS", {api.users.verify_user("u", "p")})
+    monkeypatch.setattr(api, "SERVE_WORKERS", 4)
+    assert client.put("/admin/sql-diagnostics", headers=auth, json={"enabled": True}).status_code == 409
+    assert api.sql_diag.enabled is False
@@ -0,0 +1,38 @@
+import os
+import sys
+import subprocess
+
+import pytest
+from sqlalchemy import inspect
+
+import end_homework_for_2ppa as api
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_touches_neither_database_nor_redis(tmp_path):
+    db = tmp_path / "lazy.db"
+    env = {**os.environ, "DB_URL": f"sqlite:///{db}", "REDIS_URL": "redis://localhost:1/0"}
+    out = subprocess.run(
+        [sys.executable, "-c", "import end_homework_for_2ppa as m; print(m.dao is None, type(m.rds).__name__)"],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True, timeout=60,
+    ).stdout.split()
+    assert out == ["True", "_InMemoryCache"]
+    assert not db.exists()
+
+def test_schema_version_gates_migration(db_url):
+    engine = api.make_engine(db_url)
+    try:
+        assert api.schema_version(engine) is None
+        assert api.ensure_schema(engine) == api.SCHEMA_VERSION
+        # старая база: версия ниже и индекса нет — миграция его добавляет
+        with engine.begin() as c:
+            c.exec_driver_sql("UPDATE schema_version SET version = 1")
+            name = next(i["name"] for i in inspect(c).get_indexes("students"))
+            c.exec_driver_sql(f"DROP INDEX {name}")
+        with pytest.raises(RuntimeError):
+            api.ensure_schema(engine, auto_migrate=False)
+        assert api.ensure_schema(engine) == api.SCHEMA_VERSION
+        assert name in {i["name"] for i in inspect(engine).get_indexes("students")}
+        assert api.schema_version(engine) == api.SCHEMA_VERSION
+    finally:
+        engine.dispose()
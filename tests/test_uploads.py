@@ -0,0 +1,85 @@
+import gzip
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+def csv_body(rows: int, start: int = 0) -> bytes:
+    lines = ["Фамилия,Имя,Факультет,Курс,Оценка"] + [f"S{i},N{i},ФПМИ,Физика,{i % 101}" for i in range(start, start + rows)]
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+def test_resumed_upload(client, auth):
+    body = csv_body(50)
+    up = client.post("/uploads", headers=auth).json()["upload_id"]
+    cut = len(body) // 3
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": 0}, content=body[:cut])
+    assert r.json()["offset"] == cut
+    # клиент потерял ответ и присылает кусок с неверным смещением
+    assert client.put(f"/uploads/{up}", headers=auth, params={"offset": 0}, content=body[:cut]).status_code == 409
+    offset = client.get(f"/uploads/{up}", headers=auth).json()["offset"]
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": offset, "final": True}, content=body[offset:])
+    assert r.json()["done"] and r.json()["accepted"] == 50
+    assert len(client.get("/students", headers=auth).json()) == 50
+
+def test_db_error_keeps_accepted_bytes(client, auth, app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "UPLOAD_BATCH_ROWS", 10)
+    insert_many = api.dao.insert_many
+    fails = [True]
+
+    def busy_once(rows):
+        if fails:
+            fails.pop()
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return insert_many(rows)
+
+    monkeypatch.setattr(api.dao, "insert_many", busy_once)
+    body = csv_body(30)
+    up = client.post("/uploads", headers=auth).json()["upload_id"]
+    half = len(body) // 2
+    assert client.put(f"/uploads/{up}", headers=auth, params={"offset": 0}, content=body[:half]).status_code == 503
+    offset = client.get(f"/uploads/{up}", headers=auth).json()["offset"]
+    assert offset == half
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": offset, "final": True}, content=body[offset:])
+    assert r.status_code == 200 and r.json()["accepted"] == 30
+    assert sorted(s["surname"] for s in client.get("/students", headers=auth).json()) == sorted(f"S{i}" for i in range(30))
+
+def test_bad_bytes_fail_the_upload_for_good(client, auth, app_env, monkeypatch):
+    monkeypatch.setattr(app_env, "UPLOAD_BATCH_ROWS", 1000)
+    body = csv_body(20)
+    up = client.post("/uploads", headers=auth).json()["upload_id"]
+    assert client.put(f"/uploads/{up}", headers=auth, params={"offset": 0}, content=body).status_code == 200
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": len(body)}, content=b"\xff\xfe\xfd\n")
+    assert r.status_code == 400
+    st = client.get(f"/uploads/{up}", headers=auth).json()
+    # строки до плохого куска не потерялись, загрузка закрыта
+    assert st["error"] and st["accepted"] == 20
+    assert len(client.get("/students", headers=auth).json()) == 20
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": st["offset"], "final": True}, content=b"")
+    assert r.status_code == 409
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_resume_on_another_worker(client, auth, app_env, monkeypatch, compression):
+    api = app_env
+    monkeypatch.setattr(api, "UPLOAD_BATCH_ROWS", 7)
+    body = csv_body(40)
+    if compression:
+        body = gzip.compress(body)
+    up = client.post("/uploads", headers=auth, params={"compression": compression} if compression else {}).json()["upload_id"]
+    cuts = [0, len(body) // 3, 2 * len(body) // 3 + 1, len(body)]
+    for a, b in zip(cuts, cuts[1:]):
+        # каждый кусок приходит на «другой» воркер: локального состояния нет
+        api.UPLOADS.clear()
+        r = client.put(f"/uploads/{up}", headers=auth, params={"offset": a, "final": b == len(body)}, content=body[a:b])
+        assert r.status_code == 200 and r.json()["offset"] == b
+    assert r.json()["done"] and r.json()["accepted"] == 40
+    assert sorted(s["surname"] for s in client.get("/students", headers=auth).json()) == sorted(f"S{i}" for i in range(40))
+
+def test_leased_upload_is_busy(client, auth, app_env):
+    body = csv_body(5)
+    up = client.post("/uploads", headers=auth).json()["upload_id"]
+    # PUT на другом воркере ещё идёт
+    assert app_env.uploads.claim(up, 0, "other-worker") is not None
+    assert client.put(f"/uploads/{up}", headers=auth, params={"offset": 0}, content=body).status_code == 409
+    assert app_env.uploads.save(up, "other-worker", {"received": 0, "accepted": 0, "rejected": 0, "done": 0, "error": None, "state": None}, None, True)
+    r = client.put(f"/uploads/{up}", headers=auth, params={"offset": 0, "final": True}, content=body)
+    assert r.status_code == 200 and r.json()["accepted"] == 5
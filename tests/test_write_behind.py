@@ -0,0 +1,71 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from tests.conftest import login, student
+
+def test_cache_failure_does_not_kill_writer(app_env, monkeypatch):
+    api = app_env
+    monkeypatch.setattr(api, "write_buffer", api.WriteBehindBuffer(100, 10, 0.01))
+    fails = [True]
+    flushdb = api.rds.flushdb
+
+    def flaky_flushdb():
+        if fails:
+            fails.pop()
+            raise ConnectionError("redis is down")
+        flushdb()
+
+    monkeypatch.setattr(api.rds, "flushdb", flaky_flushdb)
+    with TestClient(api.app) as c:
+        h = login(c)
+        first = c.post("/students", headers=h, json=student(surname="A"))
+        second = c.post("/students", headers=h, json=student(surname="B"))
+        assert first.status_code == 200 and second.status_code == 200
+        assert not api.write_buffer._task.done()
+        names = {r["surname"] for r in c.get("/students", headers=h).json()}
+        assert {"A", "B"} <= names
+
+def test_submit_rejects_when_writer_is_dead(app_env):
+    api = app_env
+
+    async def scenario():
+        wb = api.WriteBehindBuffer(10, 10, 0.01)
+        wb.start()
+        wb._task.cancel()
+        await asyncio.sleep(0)
+        try:
+            await wb.submit(student())
+        except api.HTTPException as e:
+            return e.status_code
+
+    assert asyncio.run(scenario()) == 503
+
+def test_bad_row_fails_only_its_request(app_env, monkeypatch):
+    api = app_env
+    api.init_resources()
+    insert_many = api.dao.insert_many
+
+    def picky_insert_many(rows):
+        if any(r["surname"] == "BAD" for r in rows):
+            raise ValueError("bad row")
+        return insert_many(rows)
+
+    monkeypatch.setattr(api.dao, "insert_many", picky_insert_many)
+
+    async def scenario():
+        wb = api.WriteBehindBuffer(100, 10, 0.05)
+        wb.start()
+        results = await asyncio.gather(
+            wb.submit(student(surname="ok1")),
+            wb.submit(student(surname="BAD")),
+            wb.submit(student(surname="ok2")),
+            return_exceptions=True,
+        )
+        await wb.stop()
+        return results
+
+    ok1, bad, ok2 = asyncio.run(scenario())
+    assert isinstance(ok1, int) and isinstance(ok2, int)
+    assert isinstance(bad, ValueError)
+    assert [r.surname for r in api.dao.get_by_ids([ok1, ok2])] == ["ok1", "ok2"]